@@ -0,0 +1,201 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+from config import settings
+from metrics import LatencyWindow
+
+
+class AdmissionRejected(Exception):
+    """Request couldn't be admitted: reason is rate_limited, queue_full or deadline."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(reason)
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, rate_per_sec: float, burst: int) -> None:
+        self.rate = rate_per_sec
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def peek(self) -> bool:
+        self._refill()
+        return self.tokens >= 1.0
+
+    def take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+# ===================== Admission controller =====================
+class AdmissionController:
+    """
+    Gate in front of upstream TTS: at most `global_limit` syntheses in flight,
+    a token bucket per user, and a bounded FIFO of waiters that give up at
+    their deadline. Runs on the event loop (not thread-safe by design).
+    """
+
+    MAX_BUCKETS = 10000
+
+    def __init__(self, global_limit: int, user_rate_per_min: float, user_burst: int, max_queue: int) -> None:
+        self.global_limit = global_limit
+        self.user_rate = user_rate_per_min / 60.0
+        self.user_burst = user_burst
+        self.max_queue = max_queue
+        self._active = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {"rate_limited": 0, "queue_full": 0, "deadline": 0}
+        self.wait = LatencyWindow()
+
+    def _bucket(self, user_id: str) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+            if len(self._buckets) > self.MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(user_id)
+        return bucket
+
+    def _reject(self, reason: str) -> AdmissionRejected:
+        self.rejected[reason] += 1
+        return AdmissionRejected(reason)
+
+    def would_admit(self, user_id: Optional[str]) -> bool:
+        """Non-consuming check: would a request from this user be admitted or queued right now?"""
+        if user_id and not self._bucket(user_id).peek():
+            return False
+        return self._active < self.global_limit or len(self._waiters) < self.max_queue
+
+    def charge(self, user_id: Optional[str]) -> None:
+        """Spend one of the user's tokens without taking a slot; raises AdmissionRejected."""
+        if user_id and not self._bucket(user_id).take():
+            raise self._reject("rate_limited")
+
+    async def acquire(self, user_id: Optional[str], timeout: Optional[float] = None) -> None:
+        self.charge(user_id)
+        if self._active < self.global_limit and not self._waiters:
+            self._active += 1
+            self.admitted += 1
+            self.wait.add(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        started = time.perf_counter()
+        try:
+            # release() hands its slot straight to us (active count unchanged)
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            raise self._reject("deadline")
+        finally:
+            if not fut.done() or fut.cancelled():
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+        self.admitted += 1
+        self.wait.add((time.perf_counter() - started) * 1000.0)
+
+    def release(self) -> None:
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[str], timeout: Optional[float] = None):
+        await self.acquire(user_id, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def guard(self, stream: AsyncIterator[bytes]) -> "AdmittedStream":
+        """Wrap a stream started under an acquired slot; the slot is released when it ends."""
+        return AdmittedStream(stream, self.release)
+
+    def stats(self) -> dict:
+        return {
+            "active": self._active,
+            "global_limit": self.global_limit,
+            "queue_depth": sum(1 for f in self._waiters if not f.done()),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "wait": self.wait.snapshot(),
+        }
+
+
+class AdmittedStream:
+    """
+    Async iterator that gives its admission slot back exactly once: on
+    exhaustion, error, aclose(), or when dropped unstarted (e.g. the client
+    disconnected before the response body began). Must be created on the
+    event loop that owns the controller; a release from garbage collection
+    is handed back to that loop.
+    """
+
+    def __init__(self, stream: AsyncIterator[bytes], release) -> None:
+        self._stream = stream
+        self._release = release
+        self._loop = asyncio.get_running_loop()
+
+    def _done(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+    def __aiter__(self) -> "AdmittedStream":
+        return self
+
+    async def __anext__(self) -> bytes:
+        try:
+            return await self._stream.__anext__()
+        except BaseException:
+            self._done()
+            raise
+
+    async def aclose(self) -> None:
+        try:
+            aclose = getattr(self._stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        finally:
+            self._done()
+
+    def __del__(self) -> None:
+        # GC may run on any thread; the controller's futures and counters are loop-only
+        release, self._release = self._release, None
+        if release is not None and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(release)
+            except RuntimeError:
+                pass
+
+
+tts_admission = AdmissionController(
+    settings.TTS_MAX_CONCURRENT,
+    settings.TTS_USER_RATE_PER_MIN,
+    settings.TTS_USER_BURST,
+    settings.TTS_MAX_QUEUE,
+)
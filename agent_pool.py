@@ -0,0 +1,155 @@
+import asyncio
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from config import settings
+from database import add_pooled_agent, bind_agent_if_unset, claim_pooled_agent, count_pooled_agents
+from executors import ExecutorBusy
+import letta_integration
+from letta_integration import letta_executor, create_letta_agent
+from metrics import LatencyWindow
+
+
+# ===================== Warm pool of Letta agents =====================
+class AgentPool:
+    """
+    Keeps LETTA_AGENT_POOL_SIZE pre-created agents in SQLite so registration
+    and first chat only have to claim one. Requests never create agents: when
+    the pool is empty the user is queued, and the background refill loop binds
+    the next agent it creates to them. Creation is rate-limited and retried
+    with exponential backoff.
+    """
+
+    def __init__(self, size: int, refill_per_min: float, max_backoff_sec: float) -> None:
+        self.size = size
+        self.interval = 60.0 / refill_per_min if refill_per_min > 0 else 0.0
+        self.max_backoff = max_backoff_sec
+        self._lock = threading.Lock()
+        self._waiting: "OrderedDict[str, None]" = OrderedDict()  # users with no agent yet
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.claimed = 0
+        self.misses = 0
+        self.created = 0
+        self.failures = 0
+        self.backoff = 0.0
+        self.create_time = LatencyWindow()
+
+    @property
+    def enabled(self) -> bool:
+        return letta_integration.letta is not None
+
+    def _kick(self) -> None:
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def claim(self, username: str) -> Optional[str]:
+        """Agent id now bound to the account, or None (one will be bound in the background)."""
+        agent_id = claim_pooled_agent(username)
+        with self._lock:
+            if agent_id:
+                self.claimed += 1
+            elif self.enabled:
+                self.misses += 1
+                self._waiting[username] = None
+        self._kick()  # top the pool back up either way
+        return agent_id
+
+    def _next_waiting(self) -> Optional[str]:
+        with self._lock:
+            if not self._waiting:
+                return None
+            username, _ = self._waiting.popitem(last=False)
+            return username
+
+    def _needed(self) -> bool:
+        with self._lock:
+            if self._waiting:
+                return True
+        return count_pooled_agents() < self.size
+
+    async def _create_one(self) -> Optional[str]:
+        started = time.perf_counter()
+        try:
+            agent_id = await letta_executor.run(create_letta_agent, f"pool-{uuid.uuid4().hex[:12]}")
+        except ExecutorBusy:
+            return None
+        if agent_id:
+            self.create_time.add((time.perf_counter() - started) * 1000.0)
+        return agent_id
+
+    async def _store(self, agent_id: str) -> None:
+        while True:
+            username = self._next_waiting()
+            if username is None:
+                await asyncio.to_thread(add_pooled_agent, agent_id)
+                return
+            if await asyncio.to_thread(bind_agent_if_unset, username, agent_id):
+                print(f"[AgentPool] bound new agent {agent_id} to {username}")
+                return
+            # That user got an agent some other way; try the next one
+
+    async def run(self) -> None:
+        """Background refill loop (started from app startup)."""
+        if not self.enabled:
+            print("[AgentPool] Letta is not configured; agent pool disabled")
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                needed = await asyncio.to_thread(self._needed)
+            except Exception as e:
+                print(f"[AgentPool] pool check failed: {e}")
+                needed = False
+            if not needed:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=60)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            agent_id = await self._create_one()
+            if agent_id:
+                self.created += 1
+                self.backoff = 0.0
+                await self._store(agent_id)
+                await asyncio.sleep(self.interval)
+            else:
+                self.failures += 1
+                self.backoff = min(self.max_backoff, max(2.0, self.backoff * 2))
+                delay = self.backoff * random.uniform(0.5, 1.0)
+                print(f"[AgentPool] agent creation failed; retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        try:
+            available = count_pooled_agents()
+        except Exception:
+            available = None
+        with self._lock:
+            waiting = len(self._waiting)
+        return {
+            "enabled": self.enabled,
+            "target_size": self.size,
+            "available": available,
+            "waiting_users": waiting,
+            "claimed": self.claimed,
+            "misses": self.misses,
+            "created": self.created,
+            "failures": self.failures,
+            "backoff_sec": self.backoff,
+            "create_time": self.create_time.snapshot(),
+        }
+
+
+agent_pool = AgentPool(
+    settings.LETTA_AGENT_POOL_SIZE,
+    settings.LETTA_AGENT_POOL_REFILL_PER_MIN,
+    settings.LETTA_AGENT_POOL_MAX_BACKOFF_SEC,
+)
@@ -6,8 +6,14 @@ from fastapi.middleware.cors import CORSMiddleware
 from routes import voice, accounts, chat, preferences, pomodoro, composio, websocket, health, tasks
 
 # Import core modules
-from database import init_db
+from database import init_db, close_db_connections
 from websocket import voice_orchestrator, followup_scanner
+from fish_client import aclose_clients
+from fish_audio import asr_executor
+from letta_integration import letta_executor
+from agent_pool import agent_pool
+from line_pool import line_pool
+from chat_history import chat_sync
 
 # ===================== FastAPI & CORS =====================
 app = FastAPI(title="BodyDouble — Letta + Fish Audio")
@@ -15,6 +21,7 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
+    expose_headers=["X-Audio-Id", "X-Audio-Url"],  # set by /voice/say; hidden from cross-origin JS otherwise
 )
 
 # Include all routers
@@ -37,3 +44,14 @@ async def startup():
     # Start background tasks
     asyncio.create_task(voice_orchestrator())
     asyncio.create_task(followup_scanner())
+    asyncio.create_task(agent_pool.run())
+    asyncio.create_task(line_pool.run())
+    asyncio.create_task(chat_sync.run())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await aclose_clients()
+    asr_executor.shutdown()
+    letta_executor.shutdown()
+    close_db_connections()
@@ -0,0 +1,197 @@
+import struct
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from vad import frame_energy_db, pcm16_to_wav
+
+
+TARGET_RATE = 16000
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_FLOAT = 3
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def is_wav(head: bytes) -> bool:
+    return len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WAVE"
+
+
+# ===================== Decoding =====================
+def _decode_samples(raw: bytes, fmt: int, bits: int, channels: int) -> Optional[np.ndarray]:
+    """Interleaved sample bytes → float32 array shaped (frames, channels) in [-1, 1]."""
+    width = bits // 8
+    usable = len(raw) - len(raw) % (width * channels)
+    raw = raw[:usable]
+    if fmt == WAVE_FORMAT_FLOAT and bits == 32:
+        x = np.frombuffer(raw, dtype="<f4").astype(np.float32)
+    elif fmt == WAVE_FORMAT_FLOAT and bits == 64:
+        x = np.frombuffer(raw, dtype="<f8").astype(np.float32)
+    elif fmt == WAVE_FORMAT_PCM and bits == 8:
+        x = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif fmt == WAVE_FORMAT_PCM and bits == 16:
+        x = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif fmt == WAVE_FORMAT_PCM and bits == 24:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        v = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        v = np.where(v & 0x800000, v - 0x1000000, v)
+        x = v.astype(np.float32) / 8388608.0
+    elif fmt == WAVE_FORMAT_PCM and bits == 32:
+        x = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        return None
+    return x.reshape(-1, channels)
+
+
+def parse_wav(data: bytes) -> Optional[Tuple[np.ndarray, int]]:
+    """Minimal RIFF/WAVE reader (PCM 8/16/24/32-bit and float); None if unsupported."""
+    if not is_wav(data):
+        return None
+    pos = 12
+    fmt = channels = rate = bits = None
+    while pos + 8 <= len(data):
+        chunk_id, size = data[pos:pos + 4], struct.unpack("<I", data[pos + 4:pos + 8])[0]
+        body = pos + 8
+        if chunk_id == b"fmt " and size >= 16:
+            if body + 16 > len(data):
+                return None
+            fmt, channels, rate, _, _, bits = struct.unpack("<HHIIHH", data[body:body + 16])
+            if fmt == WAVE_FORMAT_EXTENSIBLE and size >= 26:
+                fmt = struct.unpack("<H", data[body + 24:body + 26])[0]
+        elif chunk_id == b"data":
+            if fmt is None or not channels or not rate or not bits or bits % 8:
+                return None  # missing or nonsensical fmt chunk
+            # Browsers streaming WAV often write a 0/oversized length; clamp to what we have
+            end = min(len(data), body + size) if size else len(data)
+            samples = _decode_samples(data[body:end], fmt, bits, channels)
+            return (samples, rate) if samples is not None else None
+        pos = body + size + (size & 1)
+    return None
+
+
+# ===================== DSP =====================
+def _lowpass(x: np.ndarray, cutoff: float, taps: int = 63) -> np.ndarray:
+    """Windowed-sinc FIR; cutoff is a fraction of the sample rate (0..0.5)."""
+    n = np.arange(taps) - (taps - 1) / 2.0
+    h = 2.0 * cutoff * np.sinc(2.0 * cutoff * n) * np.hamming(taps)
+    h /= h.sum()
+    return np.convolve(x, h.astype(np.float32), mode="same")
+
+
+def resample(x: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    if src_rate == dst_rate or len(x) == 0:
+        return x
+    if dst_rate < src_rate:
+        x = _lowpass(x, 0.45 * dst_rate / src_rate)
+    n_out = int(round(len(x) * dst_rate / src_rate))
+    t_out = np.arange(n_out, dtype=np.float64) * (src_rate / dst_rate)
+    return np.interp(t_out, np.arange(len(x), dtype=np.float64), x).astype(np.float32)
+
+
+def trim_silence(x: np.ndarray, rate: int, pad_ms: int = 150, frame_ms: int = 20) -> np.ndarray:
+    """Cut leading/trailing frames below the VAD threshold, keeping a little padding."""
+    frame_len = max(1, rate * frame_ms // 1000)
+    pcm = (np.clip(x, -1.0, 1.0) * 32767.0).astype(np.int16)
+    levels = frame_energy_db(pcm, frame_len)
+    voiced = np.flatnonzero(levels > settings.VAD_THRESHOLD_DBFS)
+    if len(voiced) == 0:
+        return x  # nothing clearly above threshold: let ASR decide
+    pad = pad_ms // frame_ms
+    start = max(0, voiced[0] - pad) * frame_len
+    end = min(len(levels), voiced[-1] + 1 + pad) * frame_len
+    return x[start:end]
+
+
+# ===================== ASR preprocessing =====================
+class PreprocessStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.applied = 0
+        self.bytes_saved = 0
+        self.ms_removed = 0
+
+    def record(self, report: dict) -> None:
+        with self._lock:
+            self.requests += 1
+            if report.get("applied"):
+                self.applied += 1
+                self.bytes_saved += report["bytes_saved"]
+                self.ms_removed += report["duration_removed_ms"]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": settings.ASR_PREPROCESS,
+                "requests": self.requests,
+                "applied": self.applied,
+                "bytes_saved": self.bytes_saved,
+                "duration_removed_ms": self.ms_removed,
+            }
+
+
+preprocess_stats = PreprocessStats()
+
+
+def preprocess_for_asr(
+    data: bytes,
+    pcm_sample_rate: Optional[int] = None,
+    pcm_channels: int = 1,
+) -> Tuple[bytes, dict]:
+    """
+    WAV (or raw s16le PCM when pcm_sample_rate is given) → mono, ≤16 kHz,
+    silence-trimmed 16-bit WAV. Anything else passes through untouched.
+    Returns (audio bytes to upload, report). Audio we can't make sense of is
+    uploaded as-is with report["skipped"] saying why; ASR still gets a go.
+    """
+    if pcm_sample_rate is not None and (pcm_sample_rate <= 0 or pcm_channels <= 0):
+        report = {"applied": False, "skipped": "invalid pcm_sample_rate/pcm_channels"}
+        preprocess_stats.record(report)
+        return data, report
+    try:
+        return _preprocess(data, pcm_sample_rate, pcm_channels)
+    except Exception as e:
+        report = {"applied": False, "skipped": f"{type(e).__name__}: {e}"[:200]}
+        preprocess_stats.record(report)
+        return data, report
+
+
+def _preprocess(data: bytes, pcm_sample_rate: Optional[int], pcm_channels: int) -> Tuple[bytes, dict]:
+    if pcm_sample_rate:
+        samples = np.frombuffer(data[: len(data) - len(data) % (2 * pcm_channels)], dtype="<i2")
+        parsed = (samples.astype(np.float32).reshape(-1, pcm_channels) / 32768.0, pcm_sample_rate)
+    else:
+        parsed = parse_wav(data)
+    if parsed is None:
+        report = {"applied": False, "reason": "unsupported_format"}
+        preprocess_stats.record(report)
+        return data, report
+
+    samples, rate = parsed
+    duration_in_ms = int(len(samples) * 1000 / rate) if rate else 0
+    mono = samples.mean(axis=1) if samples.shape[1] > 1 else samples[:, 0]
+    out_rate = min(rate, TARGET_RATE)
+    mono = resample(mono, rate, out_rate)
+    mono = trim_silence(mono, out_rate)
+    out = pcm16_to_wav((np.clip(mono, -1.0, 1.0) * 32767.0).astype("<i2").tobytes(), out_rate)
+    duration_out_ms = int(len(mono) * 1000 / out_rate) if out_rate else 0
+    if len(out) >= len(data) and not pcm_sample_rate:
+        report = {"applied": False, "reason": "no_gain"}
+        preprocess_stats.record(report)
+        return data, report
+
+    report = {
+        "applied": True,
+        "sample_rate_in": rate,
+        "channels_in": int(samples.shape[1]),
+        "sample_rate_out": out_rate,
+        "bytes_in": len(data),
+        "bytes_out": len(out),
+        "bytes_saved": len(data) - len(out),
+        "duration_in_ms": duration_in_ms,
+        "duration_out_ms": duration_out_ms,
+        "duration_removed_ms": duration_in_ms - duration_out_ms,
+    }
+    preprocess_stats.record(report)
+    return out, report
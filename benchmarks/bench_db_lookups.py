@@ -0,0 +1,96 @@
+"""
+Account lookups per second: a fresh sqlite3.connect() per query (how
+database.db_connection used to work), the pooled per-thread connections
+(WAL, synchronous=NORMAL, mmap, cached statements), and get_account with
+the read-through account cache in front of them.
+
+Runs against a throwaway database seeded with --accounts rows, single-threaded
+and from --threads threads at once (the request threadpool case).
+
+    python benchmarks/bench_db_lookups.py [--accounts 1000] [--lookups 20000] [--threads 8]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["ACCOUNTS_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "accounts.db")
+os.environ.setdefault("FISH_API_KEY", "bench")
+
+import database  # noqa: E402
+from database import _load_account, db_connection, get_account, init_db  # noqa: E402
+
+LOOKUP_SQL = "SELECT username, password_hash, voice_model, letta_agent_id FROM accounts WHERE username = ?"
+
+
+def legacy_get_account(username: str):
+    """get_account as it was: connect, query, commit, close."""
+    conn = sqlite3.connect(database.DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute(LOOKUP_SQL, (username,)).fetchone()
+        conn.commit()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def seed(accounts: int) -> list:
+    init_db()
+    names = [f"user-{i}" for i in range(accounts)]
+    with db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO accounts (username, password_hash, voice_model, letta_agent_id, created_at) "
+            "VALUES (?, 'x', 'voice', ?, '2024-01-01T00:00:00+00:00')",
+            [(name, f"agent-{i}") for i, name in enumerate(names)],
+        )
+    return names
+
+
+def rate(lookup, names: list, lookups: int, threads: int) -> float:
+    per_thread = max(1, lookups // threads)
+
+    def worker(seed_: int) -> None:
+        rng = random.Random(seed_)
+        for _ in range(per_thread):
+            assert lookup(rng.choice(names)) is not None
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return per_thread * threads / (time.perf_counter() - started)
+
+
+def main(accounts: int, lookups: int, threads: int) -> None:
+    names = seed(accounts)
+    _load_account(names[0])  # open this thread's pooled connection outside the timing
+    print(f"{'threads':<10} {'connect/query':>15} {'pooled':>15} {'cached':>15}")
+    for n in sorted({1, threads}):
+        before = rate(legacy_get_account, names, lookups, n)
+        pooled = rate(lambda name: _load_account(name)[0], names, lookups, n)
+        rate(get_account, names, len(names) * 2, 1)  # warm the cache
+        cached = rate(get_account, names, lookups, n)
+        print(
+            f"{n:<10} {before:>11.0f}/sec {pooled:>11.0f}/sec {cached:>11.0f}/sec"
+            f"   pooled {pooled / before:.1f}x, cached {cached / before:.1f}x"
+        )
+    print(f"pool: {database.db_stats()}")
+    print(f"account cache: {database.account_cache.stats()}")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--accounts", type=int, default=1000)
+    ap.add_argument("--lookups", type=int, default=20000)
+    ap.add_argument("--threads", type=int, default=8)
+    args = ap.parse_args()
+    main(args.accounts, args.lookups, args.threads)
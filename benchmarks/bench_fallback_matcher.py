@@ -0,0 +1,64 @@
+"""
+Per-call cost of the offline fallback intent matcher: the old lower() +
+any(substring in text) chain vs. the compiled word-boundary regex in intents.py.
+
+    python benchmarks/bench_fallback_matcher.py [--calls 200000]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intents import intent_matcher  # noqa: E402
+
+
+def legacy_match(user_text: str):
+    """The keyword chain generate_fallback_response used to run."""
+    user_lower = user_text.lower()
+    if any(word in user_lower for word in ["hello", "hi", "hey", "good morning", "good afternoon"]):
+        return "greeting"
+    elif any(word in user_lower for word in ["help", "stuck", "confused", "don't know"]):
+        return "stuck"
+    elif any(word in user_lower for word in ["tired", "exhausted", "burned out"]):
+        return "tired"
+    elif any(word in user_lower for word in ["done", "finished", "completed", "accomplished"]):
+        return "done"
+    elif any(word in user_lower for word in ["focus", "concentrate", "work", "study"]):
+        return "focus"
+    return None
+
+
+SAMPLES = [
+    "hey",
+    "ok",
+    "I'm so exhausted today, I can't even",
+    "finally finished the essay!!",
+    "can you help me plan the afternoon",
+    "this is going nowhere",                      # legacy: "hi" inside "this"
+    "I need to study for the chemistry midterm tomorrow and I keep getting distracted by my phone",
+    "what should I do next",
+    "Whatever. Nothing matters and the to-do list keeps growing, honestly no idea where to start " * 3,
+]
+
+
+def main(calls: int) -> None:
+    per_sample = max(1, calls // len(SAMPLES))
+    print(f"{'sample':<42} {'legacy':>10} {'compiled':>10}   intents (legacy → compiled)")
+    total_legacy = total_new = 0.0
+    for text in SAMPLES:
+        t_legacy = timeit.timeit(lambda: legacy_match(text), number=per_sample) / per_sample * 1e9
+        t_new = timeit.timeit(lambda: intent_matcher.match(text), number=per_sample) / per_sample * 1e9
+        total_legacy += t_legacy
+        total_new += t_new
+        label = (text[:39] + "...") if len(text) > 42 else text
+        print(f"{label:<42} {t_legacy:>8.0f}ns {t_new:>8.0f}ns   {legacy_match(text)} → {intent_matcher.match(text)}")
+    n = len(SAMPLES)
+    print(f"{'mean':<42} {total_legacy / n:>8.0f}ns {total_new / n:>8.0f}ns   ({total_legacy / total_new:.2f}x)")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--calls", type=int, default=200000)
+    main(ap.parse_args().calls)
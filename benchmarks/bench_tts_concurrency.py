@@ -0,0 +1,121 @@
+"""
+Concurrent-stream capacity: sync TTS generator (Starlette threadpool) vs native asyncio path.
+
+Runs a local stub of the Fish /v1/tts endpoint that streams CHUNKS chunks with a
+fixed delay, then opens N simultaneous syntheses through each path and reports
+wall time and the peak number of upstream streams that were actually in flight.
+
+    python benchmarks/bench_tts_concurrency.py [--streams 20 40 80 160] [--chunks 10] [--delay 0.1]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PORT = 8799
+os.environ.setdefault("FISH_API_KEY", "bench")
+os.environ["FISH_API_BASE_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ["FISH_POOL_MAX_CONNECTIONS"] = "1000"
+os.environ["FISH_POOL_MAX_KEEPALIVE"] = "1000"
+os.environ["FISH_TTS_BACKENDS"] = "rest,sdk"  # measure the native REST stream, not the threadpooled SDK
+
+import uvicorn  # noqa: E402
+from starlette.applications import Starlette  # noqa: E402
+from starlette.concurrency import iterate_in_threadpool  # noqa: E402
+from starlette.responses import StreamingResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+import fish_audio  # noqa: E402
+from fish_client import aclose_clients  # noqa: E402
+
+
+# ===================== Stub upstream =====================
+class Upstream:
+    active = 0
+    peak = 0
+
+
+def make_app(chunks: int, delay: float) -> Starlette:
+    async def tts(request):
+        await request.body()
+
+        async def body():
+            Upstream.active += 1
+            Upstream.peak = max(Upstream.peak, Upstream.active)
+            try:
+                for _ in range(chunks):
+                    await asyncio.sleep(delay)
+                    yield b"\xff" * 4096
+            finally:
+                Upstream.active -= 1
+
+        return StreamingResponse(body(), media_type="audio/mpeg")
+
+    return Starlette(routes=[Route("/v1/tts", tts, methods=["POST"])])
+
+
+def start_stub(chunks: int, delay: float) -> uvicorn.Server:
+    config = uvicorn.Config(make_app(chunks, delay), port=PORT, log_level="warning", backlog=4096)
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+# ===================== Consumers =====================
+async def consume_sync(i: int) -> int:
+    # Exactly what StreamingResponse does with a sync generator
+    total = 0
+    async for chunk in iterate_in_threadpool(fish_audio._fish_tts_stream_rest(f"line {i}", "mp3", None)):
+        total += len(chunk)
+    return total
+
+
+async def consume_async(i: int) -> int:
+    total = 0
+    async for chunk in fish_audio.fish_tts_stream_async(f"line {i}", "mp3"):
+        total += len(chunk)
+    return total
+
+
+async def run(path: str, n: int) -> dict:
+    Upstream.peak = 0
+    consumer = consume_sync if path == "sync" else consume_async
+    t0 = time.perf_counter()
+    sizes = await asyncio.gather(*(consumer(i) for i in range(n)))
+    return {
+        "path": path,
+        "streams": n,
+        "wall_s": time.perf_counter() - t0,
+        "peak_in_flight": Upstream.peak,
+        "bytes": sum(sizes),
+    }
+
+
+async def main(args) -> None:
+    ideal = args.chunks * args.delay
+    print(f"each stream ~{ideal:.2f}s upstream; threadpool default is 40 workers\n")
+    print(f"{'path':<6} {'streams':>8} {'wall_s':>8} {'peak':>6} {'x ideal':>8}")
+    for n in args.streams:
+        for path in ("sync", "async"):
+            r = await run(path, n)
+            print(f"{r['path']:<6} {r['streams']:>8} {r['wall_s']:>8.2f} {r['peak_in_flight']:>6} {r['wall_s'] / ideal:>8.2f}")
+    await aclose_clients()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, nargs="+", default=[20, 40, 80, 160])
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=0.1)
+    args = parser.parse_args()
+    server = start_stub(args.chunks, args.delay)
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.should_exit = True
@@ -0,0 +1,99 @@
+"""
+Event-loop lag while Letta is slow.
+
+Swaps in a Letta client whose calls block for --letta-delay seconds, runs the
+voice orchestrator over a burst of events, and samples how late a 10 ms
+asyncio ticker fires meanwhile. Letta work must stay on its executor, so the
+worst lag has to stay under --max-lag-ms; exits non-zero otherwise.
+
+    python benchmarks/check_event_loop_lag.py [--events 8] [--letta-delay 1.0] [--max-lag-ms 100]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ["ACCOUNTS_DB_PATH"] = os.path.join(tempfile.mkdtemp(), "accounts.db")
+os.environ.setdefault("FISH_API_KEY", "bench")
+
+import letta_integration  # noqa: E402
+import websocket  # noqa: E402
+from database import init_db, store_account  # noqa: E402
+from models import Event, EventType, PomodoroPhase, UserPrefs  # noqa: E402
+from shared_state import user_prefs  # noqa: E402
+
+
+class _Msg:
+    message_type = "assistant_message"
+    content = "Slow but steady!"
+
+
+class SlowLetta:
+    """Stand-in for letta_client.Letta: every call blocks its thread."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.agents = self
+        self.messages = self
+
+    def create(self, **kwargs):
+        time.sleep(self.delay)
+        return type("Resp", (), {"messages": [_Msg()]})()
+
+
+async def ticker(lags: list, stop: asyncio.Event, interval: float = 0.01) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        lags.append((loop.time() - t0 - interval) * 1000.0)
+
+
+async def main(events: int, delay: float, max_lag_ms: float) -> int:
+    init_db()
+    letta_integration.letta = SlowLetta(delay)
+    for i in range(events):
+        store_account(f"lag-user-{i}", "pw", None, f"agent-{i}")
+        user_prefs[f"lag-user-{i}"] = UserPrefs(voice_enabled=False)
+
+    lags: list = []
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(lags, stop))
+    orchestrator = asyncio.create_task(websocket.voice_orchestrator())
+    started = time.perf_counter()
+    for i in range(events):
+        await websocket.event_queue.put(Event(
+            type=EventType.REMINDER_DUE,
+            user_id=f"lag-user-{i}",
+            data={"phase": PomodoroPhase.FOCUS_START, "minutes": 25},
+        ))
+    await websocket.event_queue.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await tick
+    orchestrator.cancel()
+    letta_integration.letta_executor.shutdown()
+
+    lags.sort()
+    worst = lags[-1] if lags else 0.0
+    p99 = lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0
+    print(f"events={events} letta_delay={delay}s elapsed={elapsed:.2f}s")
+    print(f"loop lag: samples={len(lags)} p99={p99:.1f}ms max={worst:.1f}ms (limit {max_lag_ms}ms)")
+    if worst > max_lag_ms:
+        print("FAIL: event loop blocked while Letta was busy")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=8)
+    ap.add_argument("--letta-delay", type=float, default=1.0)
+    ap.add_argument("--max-lag-ms", type=float, default=100.0)
+    args = ap.parse_args()
+    sys.exit(asyncio.run(main(args.events, args.letta_delay, args.max_lag_ms)))
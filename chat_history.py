@@ -0,0 +1,239 @@
+import asyncio
+import base64
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from database import (
+    add_chat_message,
+    get_account,
+    get_chat_sync_state,
+    import_letta_message,
+    set_chat_sync_state,
+    utc_iso,
+)
+import letta_integration
+from letta_integration import content_text
+from metrics import LatencyWindow
+
+
+# ===================== Cursors =====================
+def encode_cursor(created_at: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(created_at, id) from an encode_cursor() string; ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit("|", 1)
+        return created_at, int(row_id)
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+# ===================== Letta message parsing =====================
+def display_message(msg: Any) -> Optional[Tuple[str, str]]:
+    """(role, text) for user/assistant messages, None for system/reasoning/tool ones."""
+    message_type = getattr(msg, "message_type", "unknown")
+    content = content_text(getattr(msg, "content", ""))
+    if message_type == "assistant_message":
+        return "assistant", content.strip()
+    if message_type == "user_message":
+        # Extract the actual user message from the formatted prompt
+        if "User message: " in content:
+            content = content.split("User message: ")[-1].split("\nAssistant:")[0]
+        return "user", content.strip()
+    return None
+
+
+def _page_items(response: Any) -> List[Any]:
+    if isinstance(response, list):
+        return response
+    items = getattr(response, "items", None)
+    if items is None:
+        items = getattr(response, "messages", None)
+    return list(items or [])
+
+
+# ===================== Sync =====================
+class ChatHistorySync:
+    """
+    Mirrors each user's Letta conversation into chat_messages. Turns are
+    written locally when they happen (record_turn); this pulls whatever else
+    Letta holds, incrementally from the last message id seen, for users that
+    were active within CHAT_SYNC_ACTIVE_SEC. The history endpoint only waits
+    on Letta for a user's very first read (backfill).
+    """
+
+    def __init__(self, interval_sec: float, page: int, active_sec: float) -> None:
+        self.interval = interval_sec
+        self.page = page
+        self.active_sec = active_sec
+        self._lock = threading.Lock()
+        self._active: Dict[str, float] = {}   # username -> last request (monotonic)
+        self._pending: Dict[str, None] = {}   # users to sync on the next wake-up
+        self._in_turn: Counter = Counter()    # users with a /chat turn still being written
+        self._synced: set = set()             # active users synced at least once
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.syncs = 0
+        self.imported = 0
+        self.failures = 0
+        self.deferred = 0
+        self.backfills = 0
+        self.sync_time = LatencyWindow()
+
+    @property
+    def enabled(self) -> bool:
+        return letta_integration.letta is not None
+
+    def _kick(self) -> None:
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def touch(self, username: str, sync_now: bool = False) -> None:
+        """
+        Mark the user active. With sync_now, a user not synced yet since they
+        became active is synced right away instead of at the next round.
+        """
+        with self._lock:
+            sync_now = sync_now and username not in self._synced
+            self._active[username] = time.monotonic()
+            if sync_now:
+                self._pending[username] = None
+        if sync_now:
+            self._kick()
+
+    @contextmanager
+    def turn(self, username: str):
+        """Hold off syncing this user while a chat turn is between Letta and the local table."""
+        with self._lock:
+            self._in_turn[username] += 1
+            self._active[username] = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_turn[username] -= 1
+                if self._in_turn[username] <= 0:
+                    del self._in_turn[username]
+
+    def _targets(self, full_round: bool) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            for username, seen in list(self._active.items()):
+                if now - seen > self.active_sec:
+                    del self._active[username]
+                    self._synced.discard(username)
+            targets = dict(self._pending)
+            self._pending.clear()
+            if full_round:
+                targets.update(dict.fromkeys(self._active))
+            busy = [u for u in targets if u in self._in_turn]
+            for username in busy:
+                self._pending[username] = None
+                del targets[username]
+            self.deferred += len(busy)
+        return list(targets)
+
+    def sync_user(self, username: str) -> int:
+        """Blocking: import Letta messages newer than the stored cursor. Returns rows added."""
+        account = get_account(username)
+        agent_id = account.get("letta_agent_id") if account else None
+        if not agent_id or not self.enabled:
+            return 0
+        state = get_chat_sync_state(username) or {}
+        last_id = state.get("last_letta_message_id")
+        added = 0
+        while True:
+            kwargs = {"agent_id": agent_id, "limit": self.page, "order": "asc"}
+            if last_id:
+                kwargs["after"] = last_id
+            items = _page_items(letta_integration.letta.agents.messages.list(**kwargs))
+            for msg in items:
+                parsed = display_message(msg)
+                msg_id = getattr(msg, "id", None)
+                if parsed and parsed[1] and msg_id:
+                    created = getattr(msg, "date", None) or getattr(msg, "created_at", None)
+                    added += import_letta_message(username, parsed[0], parsed[1], utc_iso(created), msg_id)
+                last_id = msg_id or last_id
+            set_chat_sync_state(username, last_id)
+            if len(items) < self.page:
+                return added
+
+    async def sync(self, username: str, timeout: Optional[float] = None) -> None:
+        started = time.perf_counter()
+        try:
+            added = await letta_integration.letta_executor.run(
+                self.sync_user, username, timeout=timeout or settings.LETTA_TIMEOUT_SEC
+            )
+        except Exception as e:
+            self.failures += 1
+            print(f"[ChatSync] sync failed for {username}: {str(e) or type(e).__name__}")
+            return
+        with self._lock:
+            if username in self._active:
+                self._synced.add(username)
+        self.syncs += 1
+        self.imported += added
+        self.sync_time.add((time.perf_counter() - started) * 1000.0)
+
+    async def backfill(self, username: str) -> None:
+        """
+        Import a user's existing Letta history before their first read is
+        served, waiting at most CHAT_BACKFILL_TIMEOUT_SEC (the import carries
+        on in the background past that). No-op once the user has been synced.
+        """
+        if not self.enabled or await asyncio.to_thread(get_chat_sync_state, username) is not None:
+            return
+        self.touch(username)
+        self.backfills += 1
+        await self.sync(username, timeout=settings.CHAT_BACKFILL_TIMEOUT_SEC)
+
+    async def run(self) -> None:
+        """Background sync loop (started from app startup)."""
+        if not self.enabled:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        next_round = self._loop.time() + self.interval
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, next_round - self._loop.time()))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            full_round = self._loop.time() >= next_round
+            if full_round:
+                next_round = self._loop.time() + self.interval
+            for username in self._targets(full_round):
+                await self.sync(username)
+
+    def stats(self) -> dict:
+        with self._lock:
+            active = len(self._active)
+        return {
+            "enabled": self.enabled,
+            "active_users": active,
+            "syncs": self.syncs,
+            "imported": self.imported,
+            "failures": self.failures,
+            "deferred": self.deferred,
+            "backfills": self.backfills,
+            "sync_time": self.sync_time.snapshot(),
+        }
+
+
+chat_sync = ChatHistorySync(settings.CHAT_SYNC_INTERVAL_SEC, settings.CHAT_SYNC_PAGE, settings.CHAT_SYNC_ACTIVE_SEC)
+
+
+def record_turn(username: str, prompt: str, reply: str, asked_at: Optional[str] = None) -> None:
+    """Store one /chat exchange locally (blocking)."""
+    if prompt:
+        add_chat_message(username, "user", prompt, asked_at)
+    if reply:
+        add_chat_message(username, "assistant", reply)
@@ -0,0 +1,91 @@
+import threading
+import time
+from collections import deque
+
+from metrics import LatencyWindow
+
+
+# ===================== Circuit breaker =====================
+class CircuitBreaker:
+    """
+    closed    → calls flow; `failure_threshold` failures within `window_sec` opens it.
+    open      → calls are refused until `reset_sec` has passed.
+    half_open → exactly one probe call is let through; success closes, failure re-opens.
+    Also keeps latency samples for the backend it guards.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, window_sec: float, reset_sec: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.window_sec = window_sec
+        self.reset_sec = reset_sec
+        self.state = self.CLOSED
+        self.latency = LatencyWindow()
+        self._lock = threading.Lock()
+        self._failures: "deque[float]" = deque()
+        self._opened_at = 0.0
+        self._probe_started = 0.0
+        self.successes = 0
+        self.failures = 0
+        self.short_circuits = 0
+        self.last_error = None
+
+    def allow(self) -> bool:
+        """May a call go to this backend now? (In half-open, claims the single probe slot.)"""
+        now = time.monotonic()
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and now - self._opened_at >= self.reset_sec:
+                self.state = self.HALF_OPEN
+                self._probe_started = now
+                return True
+            if self.state == self.HALF_OPEN and now - self._probe_started >= self.reset_sec:
+                # The previous probe never reported back; let another one through
+                self._probe_started = now
+                return True
+            self.short_circuits += 1
+            return False
+
+    def record_success(self, latency_ms: float) -> None:
+        self.latency.add(latency_ms)
+        with self._lock:
+            self.successes += 1
+            if self.state != self.CLOSED:
+                print(f"[Breaker {self.name}] closed")
+            self.state = self.CLOSED
+            self._failures.clear()
+
+    def record_failure(self, error: BaseException) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"[:200]
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window_sec:
+                self._failures.popleft()
+            if self.state == self.HALF_OPEN or len(self._failures) >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"[Breaker {self.name}] open after: {self.last_error}")
+                self.state = self.OPEN
+                self._opened_at = now
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            state = self.state
+            recent = len(self._failures)
+            retry_in = max(0.0, self.reset_sec - (time.monotonic() - self._opened_at)) if state == self.OPEN else None
+        return {
+            "state": state,
+            "recent_failures": recent,
+            "retry_in_sec": round(retry_in, 1) if retry_in is not None else None,
+            "successes": self.successes,
+            "failures": self.failures,
+            "short_circuits": self.short_circuits,
+            "last_error": self.last_error,
+            "latency_to_first_chunk": self.latency.snapshot(),
+        }
@@ -8,11 +8,112 @@ class Settings(BaseSettings):
     FISH_API_KEY: str
     FISH_MODEL: str = "s1"
     FISH_VOICE_REFERENCE_ID: Optional[str] = None
+    FISH_API_BASE_URL: str = "https://api.fish.audio"
+
+    # Fish connection pool (shared keep-alive client for TTS/ASR)
+    FISH_HTTP2: bool = True
+    FISH_POOL_MAX_CONNECTIONS: int = 20
+    FISH_POOL_MAX_KEEPALIVE: int = 10
+    FISH_POOL_KEEPALIVE_SEC: float = 60.0
+    FISH_POOL_TIMEOUT_SEC: float = 30.0
+    FISH_CONNECT_TIMEOUT_SEC: float = 10.0
+    FISH_READ_TIMEOUT_SEC: float = 120.0
+    FISH_BREAKER_FAILURES: int = 3      # failures within the window that open a backend's breaker
+    FISH_BREAKER_WINDOW_SEC: float = 60.0
+    FISH_BREAKER_RESET_SEC: float = 30.0  # how often an open backend gets a probe request
+    FISH_ASYNC_TTS: bool = True  # False -> sync generator in Starlette's threadpool
+    FISH_TTS_BACKENDS: str = "sdk,rest"  # TTS backend order for both paths; "rest,sdk" streams without a worker thread
+
+    # Sentence-pipelined TTS (async path only)
+    FISH_TTS_PIPELINE: bool = False  # default when a request doesn't say
+    FISH_TTS_PIPELINE_LOOKAHEAD: int = 2
+    FISH_TTS_PIPELINE_MIN_CHARS: int = 24
+    FISH_TTS_PIPELINE_MAX_CHARS: int = 180
+
+    # Voice model catalogue (/voice/models) cache
+    VOICE_MODELS_TTL_SEC: float = 600.0
+    VOICE_MODELS_STALE_SEC: float = 3600.0  # serve stale while refreshing in the background
+    VOICE_MODEL_STRICT: bool = False        # only accept voice ids present in the cached catalogue
+
+    # ASR worker pool and uploads
+    ASR_WORKERS: int = 4
+    ASR_MAX_QUEUE: int = 16
+    ASR_TIMEOUT_SEC: float = 120.0
+    ASR_MAX_UPLOAD_MB: int = 25
+    ASR_PREPROCESS: bool = True  # WAV/PCM → mono 16 kHz, silence-trimmed
+
+    # Streaming ASR (/ws/asr) voice-activity segmentation
+    ASR_STREAM_SILENCE_MS: int = 600
+    ASR_STREAM_MIN_SPEECH_MS: int = 250
+    ASR_STREAM_MAX_SEGMENT_MS: int = 15000
+    VAD_THRESHOLD_DBFS: float = -45.0
+    VAD_NOISE_MARGIN_DB: float = 10.0
+
+    # TTS audio cache (content-addressed files, LRU-evicted)
+    TTS_CACHE_ENABLED: bool = True
+    TTS_CACHE_DIR: str = os.path.join(os.path.dirname(__file__), "tts_cache")
+    TTS_CACHE_MAX_MB: int = 256
+
+    # Absolute origin for replay links (e.g. "https://api.example.com"); when unset,
+    # HTTP responses use the request's own base URL and WebSocket messages stay relative
+    PUBLIC_BASE_URL: Optional[str] = None
+
+    # TTS admission control (upstream syntheses only; cache hits/joins are free)
+    TTS_MAX_CONCURRENT: int = 16
+    TTS_MAX_QUEUE: int = 64
+    TTS_USER_RATE_PER_MIN: float = 30.0
+    TTS_USER_BURST: int = 6
+    TTS_ADMISSION_WAIT_SEC: float = 5.0        # /voice/say callers
+    TTS_ADMISSION_EVENT_WAIT_SEC: float = 1.0  # pushed event audio; past this we send text only
+
+    # /voice/say_batch preloading
+    TTS_BATCH_MAX_LINES: int = 50
+    TTS_BATCH_CONCURRENCY: int = 4
+
+    # Event orchestrator: events are sharded by user_id across workers (per-user order kept)
+    ORCH_WORKERS: int = 8
+    ORCH_SHARD_QUEUE: int = 100
+    ORCH_COALESCE_MS: int = 500          # a user's events this close together get one message (0 = off)
+    ORCH_COALESCE_MAX_EVENTS: int = 4
 
     # Letta
     LETTA_API_KEY: Optional[str] = None
     LETTA_BASE_URL: Optional[str] = None
     LETTA_AGENT_ID: Optional[str] = None
+    LETTA_WORKERS: int = 8
+    LETTA_MAX_QUEUE: int = 64
+    LETTA_TIMEOUT_SEC: float = 20.0         # one reply; past this the caller uses fallback copy
+    LETTA_CREATE_TIMEOUT_SEC: float = 30.0  # agent creation (keeps going in the background)
+    # Event copy latency budget: past the deadline the fallback line is sent, and a
+    # real reply arriving within the grace window follows as an "update" message
+    LETTA_DEADLINE_REMINDER_SEC: float = 3.0
+    LETTA_DEADLINE_FOLLOWUP_SEC: float = 6.0
+    LETTA_LATE_GRACE_SEC: float = 20.0
+    LETTA_AGENT_POOL_SIZE: int = 5              # spare pre-created agents kept ready
+    LETTA_AGENT_POOL_REFILL_PER_MIN: float = 6.0
+    LETTA_AGENT_POOL_MAX_BACKOFF_SEC: float = 300.0
+
+    # Pre-generated Pomodoro lines (written by the shared LETTA_AGENT_ID agent)
+    LINE_POOL_ENABLED: bool = True
+    LINE_POOL_SIZE: int = 8                 # lines kept per (personality, phase, minutes)
+    LINE_POOL_MAX_USES: int = 20            # serves before a line is retired
+    LINE_POOL_REFILL_INTERVAL_SEC: float = 2.0
+    LINE_POOL_FOCUS_MIN: int = 25           # phase lengths generated ahead of first use
+    LINE_POOL_BREAK_MIN: int = 5
+
+    # SQLite (accounts, chat history, agent pool)
+    DB_MMAP_BYTES: int = 64 * 1024 * 1024
+    DB_STATEMENT_CACHE: int = 256           # prepared statements kept per connection
+    ACCOUNT_CACHE_SIZE: int = 10000         # cached account rows (0 = off)
+    ACCOUNT_CACHE_TTL_SEC: float = 60.0
+    ACCOUNT_CACHE_CHECK_SEC: float = 0.1    # how stale another process's account write can look
+
+    # Local chat history mirror (served from SQLite, synced from Letta in the background)
+    CHAT_SYNC_INTERVAL_SEC: float = 30.0
+    CHAT_SYNC_PAGE: int = 100               # Letta messages fetched per call
+    CHAT_SYNC_ACTIVE_SEC: float = 3600.0    # users synced by the loop after their last request
+    CHAT_HISTORY_MAX_LIMIT: int = 200
+    CHAT_BACKFILL_TIMEOUT_SEC: float = 5.0  # a user's first history read waits this long for Letta
 
     # Composio (Gmail)
     COMPOSIO_API_KEY: Optional[str] = None
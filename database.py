@@ -3,9 +3,13 @@ import hashlib
 import hmac
 import secrets
 import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from contextlib import contextmanager
 from datetime import datetime, timezone
-from typing import Dict, Optional
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
 from config import settings
 
@@ -15,15 +19,121 @@ DB_PATH = os.getenv("ACCOUNTS_DB_PATH", os.path.join(os.path.dirname(__file__),
 PBKDF2_ITERATIONS = 100_000
 
 
-@contextmanager
-def db_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH, timeout=30)
-    conn.row_factory = sqlite3.Row
-    try:
-        yield conn
-        conn.commit()
-    finally:
-        conn.close()
+class _ConnectionPool:
+    """
+    One long-lived connection per thread (request threadpool, Letta and ASR
+    workers, asyncio.to_thread), so lookups skip connect/close and reuse the
+    connection's prepared-statement cache. Connections open in WAL mode, so
+    readers never wait on the single writer, with synchronous=NORMAL and the
+    file memory-mapped. A thread's connection is closed when the thread goes
+    away (idle threadpool workers retire), and a forked worker process opens
+    its own.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all: Set[sqlite3.Connection] = set()
+        self._pid = os.getpid()
+        self._generation = 0  # bumped by close_all(); older thread-local handles are reopened
+        self.opened = 0
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=30,
+            check_same_thread=False,  # only its own thread uses it; close_all() runs elsewhere
+            cached_statements=settings.DB_STATEMENT_CACHE,
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(settings.DB_MMAP_BYTES)}")
+        with self._lock:
+            self._all.add(conn)
+            self.opened += 1
+        weakref.finalize(threading.current_thread(), self._retire, conn)
+        return conn
+
+    def _retire(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            self._all.discard(conn)
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def connection(self) -> sqlite3.Connection:
+        if os.getpid() != self._pid:
+            # Inherited across fork: never touch the parent's handles
+            with self._lock:
+                self._all = set()
+                self._generation += 1
+            self._pid = os.getpid()
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            local.conn = self._open()
+            local.generation = self._generation
+            local.depth = 0
+        return local.conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self.connection()
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            if self._local.depth == 1 and conn.in_transaction:
+                conn.rollback()
+            raise
+        else:
+            if self._local.depth == 1:
+                conn.commit()
+        finally:
+            self._local.depth -= 1
+
+    def data_version_changed(self) -> bool:
+        """
+        True if another connection (thread or process) committed since this
+        thread last asked. PRAGMA data_version is per-connection and cheap.
+        """
+        conn = self.connection()
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        changed = getattr(self._local, "data_version", None) != version
+        self._local.data_version = version
+        return changed
+
+    def close_all(self) -> None:
+        with self._lock:
+            conns, self._all = self._all, set()
+            self._generation += 1
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"open_connections": len(self._all), "opened": self.opened}
+
+
+_pool = _ConnectionPool(DB_PATH)
+
+
+def db_connection():
+    """Context manager yielding this thread's connection; commits on exit, rolls back on error."""
+    return _pool.transaction()
+
+
+def close_db_connections() -> None:
+    _pool.close_all()
+
+
+def db_stats() -> dict:
+    return _pool.stats()
 
 
 def init_db() -> None:
@@ -53,7 +163,50 @@ def init_db() -> None:
                 password_hash TEXT NOT NULL,
                 voice_model TEXT,
                 letta_agent_id TEXT,
-                created_at TEXT NOT NULL
+                created_at TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(accounts)").fetchall()]
+        if "version" not in columns:
+            # Bumped by every account write; lets caches in other processes notice
+            conn.execute("ALTER TABLE accounts ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT NOT NULL,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                letta_message_id TEXT
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_chat_messages_user_time ON chat_messages (username, created_at, id)"
+        )
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_chat_messages_letta_id ON chat_messages (letta_message_id) "
+            "WHERE letta_message_id IS NOT NULL"
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chat_sync_state (
+                username TEXT PRIMARY KEY,
+                last_letta_message_id TEXT,
+                synced_at TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS agent_pool (
+                agent_id TEXT PRIMARY KEY,
+                created_at TEXT NOT NULL,
+                claimed_by TEXT,
+                claimed_at TEXT
             )
             """
         )
@@ -80,15 +233,129 @@ def verify_password(password: str, stored_hash: str) -> bool:
     return hmac.compare_digest(candidate, expected)
 
 
-def get_account(username: str) -> Optional[Dict[str, Optional[str]]]:
+# ===================== Account cache =====================
+class _AccountCache:
+    """
+    Read-through LRU of account rows, bounded by ACCOUNT_CACHE_SIZE entries
+    and ACCOUNT_CACHE_TTL_SEC. Writers in this module call invalidate().
+    Writes from other processes are caught by PRAGMA data_version, polled at
+    most every ACCOUNT_CACHE_CHECK_SEC per thread: once it moves, each entry
+    is rechecked against its row's version column before it is served again.
+    """
+
+    def __init__(self, size: int, ttl_sec: float, check_sec: float) -> None:
+        self.size = size
+        self.ttl = ttl_sec
+        self.check_interval = check_sec
+        self._local = threading.local()  # last data_version poll of this thread
+        self._lock = threading.Lock()
+        # username -> [row, version, loaded_at, epoch checked]
+        self._entries: "OrderedDict[str, list]" = OrderedDict()
+        self._epoch = 0       # bumped whenever another connection has committed
+        self._generation = 0  # bumped by invalidate(); stops in-flight loads caching stale rows
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stale = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0 and self.ttl > 0
+
+    def get(self, username: str) -> Optional[Dict[str, Optional[str]]]:
+        if not self.enabled:
+            return _load_account(username)[0]
+        now = time.monotonic()
+        if now - getattr(self._local, "checked_at", -self.check_interval) >= self.check_interval:
+            self._local.checked_at = now
+            if _pool.data_version_changed():
+                with self._lock:
+                    self._epoch += 1
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None and now - entry[2] < self.ttl:
+                self._entries.move_to_end(username)
+                if entry[3] == self._epoch:
+                    self.hits += 1
+                    return dict(entry[0])
+                epoch, version = self._epoch, entry[1]
+            else:
+                epoch, version = self._epoch, None
+            generation = self._generation
+
+        if version is not None:
+            with db_connection() as conn:
+                current = conn.execute("SELECT version FROM accounts WHERE username = ?", (username,)).fetchone()
+            if current is not None and current[0] == version:
+                with self._lock:
+                    entry = self._entries.get(username)
+                    if entry is not None and entry[1] == version:
+                        entry[3] = max(entry[3], epoch)
+                        self.revalidated += 1
+                        return dict(entry[0])
+            with self._lock:
+                self.stale += 1
+
+        row, version = _load_account(username)
+        with self._lock:
+            self.misses += 1
+            if row is None:
+                self._entries.pop(username, None)
+            elif generation == self._generation:
+                self._entries[username] = [row, version, now, epoch]
+                self._entries.move_to_end(username)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return dict(row) if row else None
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            self._generation += 1
+            self.invalidations += 1
+            self._entries.pop(username, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.revalidated + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.size,
+                "ttl_sec": self.ttl,
+                "hits": self.hits,
+                "revalidated": self.revalidated,
+                "misses": self.misses,
+                "stale": self.stale,
+                "invalidations": self.invalidations,
+                "hit_ratio": round((self.hits + self.revalidated) / lookups, 3) if lookups else None,
+            }
+
+
+account_cache = _AccountCache(
+    settings.ACCOUNT_CACHE_SIZE, settings.ACCOUNT_CACHE_TTL_SEC, settings.ACCOUNT_CACHE_CHECK_SEC
+)
+
+
+def _load_account(username: str) -> Tuple[Optional[Dict[str, Optional[str]]], Optional[int]]:
     with db_connection() as conn:
         row = conn.execute(
-            "SELECT username, password_hash, voice_model, letta_agent_id FROM accounts WHERE username = ?",
+            "SELECT username, password_hash, voice_model, letta_agent_id, version FROM accounts WHERE username = ?",
             (username,),
         ).fetchone()
-        if not row:
-            return None
-        return dict(row)
+    if not row:
+        return None, None
+    account = dict(row)
+    return account, account.pop("version")
+
+
+def get_account(username: str) -> Optional[Dict[str, Optional[str]]]:
+    return account_cache.get(username)
 
 
 def store_account(username: str, password: str, voice_model: Optional[str], agent_id: Optional[str] = None) -> Dict[str, Optional[str]]:
@@ -103,20 +370,191 @@ def store_account(username: str, password: str, voice_model: Optional[str], agen
             )
     except sqlite3.IntegrityError:
         raise
+    account_cache.invalidate(username)
     return {"username": username, "voice_model": preferred_voice, "letta_agent_id": agent_id}
 
 
 def update_account_agent_id(username: str, agent_id: str) -> None:
     with db_connection() as conn:
         conn.execute(
-            "UPDATE accounts SET letta_agent_id = ? WHERE username = ?",
+            "UPDATE accounts SET letta_agent_id = ?, version = version + 1 WHERE username = ?",
             (agent_id, username)
         )
+    account_cache.invalidate(username)
 
 
 def update_account_voice_model(username: str, voice_model: str) -> None:
     with db_connection() as conn:
         conn.execute(
-            "UPDATE accounts SET voice_model = ? WHERE username = ?",
+            "UPDATE accounts SET voice_model = ?, version = version + 1 WHERE username = ?",
             (voice_model, username),
-        )
\ No newline at end of file
+        )
+    account_cache.invalidate(username)
+
+# ===================== Pre-provisioned Letta agents =====================
+def add_pooled_agent(agent_id: str) -> None:
+    with db_connection() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO agent_pool (agent_id, created_at) VALUES (?, ?)",
+            (agent_id, datetime.now(timezone.utc).isoformat()),
+        )
+
+
+def count_pooled_agents() -> int:
+    with db_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM agent_pool WHERE claimed_by IS NULL").fetchone()[0]
+
+
+def claim_pooled_agent(username: str) -> Optional[str]:
+    """
+    Atomically take the oldest unclaimed agent and bind it to the account.
+    Returns the account's agent id (existing or newly claimed), or None if
+    the account doesn't exist or the pool is empty.
+    """
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT letta_agent_id FROM accounts WHERE username = ?", (username,)).fetchone()
+        if row is None:
+            return None
+        if row["letta_agent_id"]:
+            return row["letta_agent_id"]
+        claimed = conn.execute(
+            """
+            UPDATE agent_pool SET claimed_by = ?, claimed_at = ?
+            WHERE agent_id = (
+                SELECT agent_id FROM agent_pool WHERE claimed_by IS NULL ORDER BY created_at LIMIT 1
+            )
+            RETURNING agent_id
+            """,
+            (username, datetime.now(timezone.utc).isoformat()),
+        ).fetchone()
+        if claimed is None:
+            return None
+        conn.execute(
+            "UPDATE accounts SET letta_agent_id = ?, version = version + 1 WHERE username = ?",
+            (claimed["agent_id"], username),
+        )
+    account_cache.invalidate(username)
+    return claimed["agent_id"]
+
+
+def bind_agent_if_unset(username: str, agent_id: str) -> bool:
+    """Give an account an agent unless it already has one; False if nothing changed."""
+    with db_connection() as conn:
+        cur = conn.execute(
+            "UPDATE accounts SET letta_agent_id = ?, version = version + 1 "
+            "WHERE username = ? AND (letta_agent_id IS NULL OR letta_agent_id = '')",
+            (agent_id, username),
+        )
+    if cur.rowcount > 0:
+        account_cache.invalidate(username)
+        return True
+    return False
+
+
+# ===================== Local chat history =====================
+# Timestamps are UTC ISO-8601 with microseconds, so string order == time order.
+CHAT_RECONCILE_SEC = 600
+
+
+def utc_iso(dt: Optional[Any] = None) -> str:
+    if dt is None:
+        dt = datetime.now(timezone.utc)
+    elif isinstance(dt, str):
+        dt = datetime.fromisoformat(dt.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+
+def add_chat_message(username: str, role: str, content: str, created_at: Optional[str] = None) -> Dict[str, Any]:
+    created_at = created_at or utc_iso()
+    with db_connection() as conn:
+        cur = conn.execute(
+            "INSERT INTO chat_messages (username, role, content, created_at) VALUES (?, ?, ?, ?)",
+            (username, role, content, created_at),
+        )
+        return {"id": cur.lastrowid, "username": username, "role": role, "content": content, "created_at": created_at}
+
+
+def import_letta_message(username: str, role: str, content: str, created_at: str, letta_message_id: str) -> bool:
+    """
+    Mirror one Letta message. A turn we already stored at send time (same
+    role and text, within CHAT_RECONCILE_SEC) is linked instead of duplicated.
+    Returns True if a new row was inserted.
+    """
+    with db_connection() as conn:
+        if conn.execute(
+            "SELECT 1 FROM chat_messages WHERE letta_message_id = ?", (letta_message_id,)
+        ).fetchone():
+            return False
+        linked = conn.execute(
+            """
+            UPDATE OR IGNORE chat_messages SET letta_message_id = ?
+            WHERE id = (
+                SELECT id FROM chat_messages
+                WHERE username = ? AND role = ? AND content = ? AND letta_message_id IS NULL
+                  AND ABS(julianday(created_at) - julianday(?)) * 86400 < ?
+                ORDER BY id LIMIT 1
+            )
+            """,
+            (letta_message_id, username, role, content, created_at, CHAT_RECONCILE_SEC),
+        ).rowcount
+        if linked:
+            return False
+        # OR IGNORE: a concurrent sync of the same user may have just stored it
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO chat_messages (username, role, content, created_at, letta_message_id) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (username, role, content, created_at, letta_message_id),
+        )
+        return cur.rowcount > 0
+
+
+def list_chat_messages(
+    username: str,
+    limit: int,
+    before: Optional[Tuple[str, int]] = None,
+    after: Optional[Tuple[str, int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    One page from the (username, created_at, id) index. `before`/`after` are
+    (created_at, id) keys; with `after` the page is the oldest rows past it
+    (ascending), otherwise the newest rows before it (descending).
+    """
+    where, params = ["username = ?"], [username]
+    if before is not None:
+        where.append("(created_at, id) < (?, ?)")
+        params.extend(before)
+    if after is not None:
+        where.append("(created_at, id) > (?, ?)")
+        params.extend(after)
+    direction = "ASC" if after is not None and before is None else "DESC"
+    with db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT id, role, content, created_at FROM chat_messages WHERE {' AND '.join(where)} "
+            f"ORDER BY created_at {direction}, id {direction} LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def get_chat_sync_state(username: str) -> Optional[Dict[str, Optional[str]]]:
+    with db_connection() as conn:
+        row = conn.execute(
+            "SELECT last_letta_message_id, synced_at FROM chat_sync_state WHERE username = ?", (username,)
+        ).fetchone()
+        return dict(row) if row else None
+
+
+def set_chat_sync_state(username: str, last_letta_message_id: Optional[str]) -> None:
+    with db_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO chat_sync_state (username, last_letta_message_id, synced_at) VALUES (?, ?, ?)
+            ON CONFLICT(username) DO UPDATE SET
+                last_letta_message_id = COALESCE(excluded.last_letta_message_id, last_letta_message_id),
+                synced_at = excluded.synced_at
+            """,
+            (username, last_letta_message_id, utc_iso()),
+        )
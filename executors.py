@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from metrics import LatencyWindow
+
+
+class ExecutorBusy(Exception):
+    """The executor's wait queue is full; the caller should shed load."""
+
+
+# ===================== Bounded worker pool =====================
+class BoundedExecutor:
+    """
+    Thread pool for blocking calls made from async code, with a hard cap on
+    queued work so a slow upstream can't pile up unbounded requests.
+    Tracks queue wait and run time for the status endpoint.
+    """
+
+    def __init__(self, name: str, workers: int, max_queue: int) -> None:
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-worker")
+        self._lock = threading.Lock()
+        self._pending = 0   # queued + running
+        self._running = 0
+        self.submitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.wait = LatencyWindow()
+        self.run_time = LatencyWindow()
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run fn(*args, **kwargs) on a worker thread without blocking the loop.
+        Raises ExecutorBusy when the queue is full and asyncio.TimeoutError
+        after `timeout` seconds (the worker finishes in the background).
+        """
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise ExecutorBusy(f"{self.name} queue full ({self.max_queue})")
+            self._pending += 1
+            self.submitted += 1
+        enqueued = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            self.wait.add((started - enqueued) * 1000.0)
+            with self._lock:
+                self._running += 1
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                self.run_time.add((time.perf_counter() - started) * 1000.0)
+
+        future = self._pool.submit(job)
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+
+    def submit(self, fn: Callable[..., Any], *args) -> None:
+        """Fire-and-forget cleanup work; not counted against the queue bound."""
+        self._pool.submit(fn, *args)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending, running = self._pending, self._running
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": running,
+            "queue_depth": max(0, pending - running),
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "queue_wait": self.wait.snapshot(),
+            "run_time": self.run_time.snapshot(),
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -1,38 +1,134 @@
-from typing import Optional
-import requests  # REST fallback
+import asyncio
+import re
+import time
+from collections import deque
+from typing import IO, List, Optional, Union
+
+import httpx
+
+from starlette.concurrency import iterate_in_threadpool
 
 from config import settings
+from circuit_breaker import CircuitBreaker
+from executors import BoundedExecutor
+from fish_client import afish_stream, fish_stream, fish_request, get_sdk_session, sdk_stream
+from metrics import LatencyWindow
 
 # ===================== Try Fish SDK (fallback to REST if import fails) =====================
 FISH_MODE = "rest"
 try:
-    from fish_audio_sdk import Session, TTSRequest, ASRRequest, Prosody  # type: ignore
+    from fish_audio_sdk import TTSRequest, ASRRequest, Prosody  # type: ignore
     FISH_MODE = "sdk"
 except Exception:
     FISH_MODE = "rest"
 
 
-def _fish_tts_stream_rest(text: str, fmt: str, reference_id: Optional[str]):
-    """
-    Minimal REST call with required 'model' header; stream audio chunks.
-    """
-    url = "https://api.fish.audio/v1/tts"
-    headers = {
-        "Authorization": f"Bearer {settings.FISH_API_KEY}",
+def _rest_headers() -> dict:
+    return {
         "Content-Type": "application/json",
         "model": settings.FISH_MODEL or "s1",  # REST requires model header
     }
+
+
+def _rest_payload(text: str, fmt: str, reference_id: Optional[str]) -> dict:
     payload = {"text": text, "format": fmt}
     rid = reference_id or settings.FISH_VOICE_REFERENCE_ID
     if rid:
         payload["reference_id"] = rid
+    return payload
+
+
+def _fish_tts_stream_rest(text: str, fmt: str, reference_id: Optional[str]):
+    """
+    Minimal REST call with required 'model' header; stream audio chunks
+    over the shared keep-alive client.
+    """
+    headers = _rest_headers()
+    payload = _rest_payload(text, fmt, reference_id)
 
-    with requests.post(url, headers=headers, json=payload, stream=True, timeout=120) as r:
+    with fish_stream("POST", "/v1/tts", headers=headers, json=payload) as r:
         r.raise_for_status()
-        for chunk in r.iter_content(65536):
+        for chunk in r.iter_bytes(65536):
             if chunk:
                 yield chunk
 
+
+async def _afish_tts_stream_rest(text: str, fmt: str, reference_id: Optional[str]):
+    """Same minimal REST call on the shared AsyncClient; no worker thread is held."""
+    payload = _rest_payload(text, fmt, reference_id)
+    async with afish_stream("POST", "/v1/tts", headers=_rest_headers(), json=payload) as r:
+        r.raise_for_status()
+        async for chunk in r.aiter_bytes(65536):
+            if chunk:
+                yield chunk
+
+
+def _fish_tts_stream_sdk(
+    text: str,
+    fmt: str,
+    reference_id: Optional[str],
+    speed: float,
+    volume: int,
+    latency: str,
+):
+    """
+    Minimal SDK path based on official docs:
+      - Only pass text/format/reference_id/latency/Prosody (if non-default)
+      - Same model as the REST path (FISH_MODEL), not the SDK's own default
+    """
+    session = get_sdk_session()
+    req_kwargs = {"text": text, "format": fmt, "latency": latency}
+    rid = reference_id or settings.FISH_VOICE_REFERENCE_ID
+    if rid:
+        req_kwargs["reference_id"] = rid
+    if speed != 1.0 or volume != 0:
+        req_kwargs["prosody"] = Prosody(speed=speed, volume=volume)
+    yield from sdk_stream(session.tts(TTSRequest(**req_kwargs), backend=settings.FISH_MODEL or "s1"))
+
+
+# ===================== Backend circuit breakers =====================
+def _make_breaker(name: str) -> CircuitBreaker:
+    return CircuitBreaker(
+        name,
+        failure_threshold=settings.FISH_BREAKER_FAILURES,
+        window_sec=settings.FISH_BREAKER_WINDOW_SEC,
+        reset_sec=settings.FISH_BREAKER_RESET_SEC,
+    )
+
+
+breakers = {"sdk": _make_breaker("fish-sdk"), "rest": _make_breaker("fish-rest")}
+
+
+def _error_status(e: BaseException) -> Optional[int]:
+    status = getattr(e, "status", None) or getattr(e, "status_code", None)
+    if status is None and isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+    return status if isinstance(status, int) else None
+
+
+def is_backend_failure(e: BaseException) -> bool:
+    """
+    Only errors that say the backend itself is unhealthy trip a breaker:
+    transport errors, timeouts and 5xx. A 4xx (e.g. one user's bad
+    reference_id) is the caller's problem and must not open it for everyone.
+    """
+    status = _error_status(e)
+    if status is not None:
+        return status >= 500
+    return isinstance(e, (httpx.TransportError, TimeoutError, OSError))
+
+
+def breaker_stats() -> dict:
+    return {name: b.snapshot() for name, b in breakers.items()}
+
+
+def backend_order() -> List[str]:
+    """FISH_TTS_BACKENDS as a list, without the SDK when it isn't installed."""
+    names = [b.strip() for b in settings.FISH_TTS_BACKENDS.split(",")]
+    order = [b for b in dict.fromkeys(names) if b in breakers and (b != "sdk" or FISH_MODE == "sdk")]
+    return order or ["rest"]
+
+
 def fish_tts_stream(
     text: str,
     fmt: str = "mp3",
@@ -44,50 +140,261 @@ def fish_tts_stream(
     top_p: float = 0.7,        # kept in signature but NOT sent
 ):
     """
-    Minimal SDK path based on official docs:
-      - Only pass text/format/reference_id/latency/Prosody (if non-default)
-      - If SDK raises (400/401/422/others), fall back to REST with 'model' header
+    Try backends in FISH_TTS_BACKENDS order (default SDK, then REST) but skip
+    any whose breaker is open, so a broken SDK costs nothing once detected; an
+    open breaker lets one probe request through every FISH_BREAKER_RESET_SEC.
+    A backend that fails before its first chunk falls through to the next;
+    once audio has been sent, errors propagate (we can't splice two streams).
     """
-    if FISH_MODE == "sdk":
-        session = Session(settings.FISH_API_KEY)
-        req_kwargs = {"text": text, "format": fmt, "latency": latency}
-        rid = reference_id or settings.FISH_VOICE_REFERENCE_ID
-        if rid:
-            req_kwargs["reference_id"] = rid
-        if speed != 1.0 or volume != 0:
-            req_kwargs["prosody"] = Prosody(speed=speed, volume=volume)
+    starts = {
+        "sdk": lambda: _fish_tts_stream_sdk(text, fmt, reference_id, speed, volume, latency),
+        "rest": lambda: _fish_tts_stream_rest(text, fmt, reference_id),  # minimal fields
+    }
+    backends = backend_order()
 
+    tried = 0
+    for i, name in enumerate(backends):
+        breaker = breakers[name]
+        last = i == len(backends) - 1
+        # allow() is only asked when we'd really call the backend (it may hand out the probe slot);
+        # if every breaker is open we still try the last resort rather than fail outright.
+        if not breaker.allow() and not (last and tried == 0):
+            continue
+        tried += 1
+        t0 = time.perf_counter()
+        sent = False
         try:
-            req = TTSRequest(**req_kwargs)
-            for chunk in session.tts(req):
+            for chunk in starts[name]():
+                if not sent:
+                    breaker.record_success((time.perf_counter() - t0) * 1000.0)
+                    sent = True
                 yield chunk
             return
         except Exception as e:
-            # Log briefly (optional)
-            try:
-                status = getattr(e, "status", None) or getattr(e, "status_code", None)
-                print(f"[Fish SDK] TTS failed with status={status}, falling back to REST.")
-            except Exception:
-                print("[Fish SDK] TTS failed, falling back to REST.")
-            # fall through to REST
+            if is_backend_failure(e):
+                breaker.record_failure(e)
+            if sent or last:
+                raise
+            status = getattr(e, "status", None) or getattr(e, "status_code", None)
+            print(f"[Fish {name}] TTS failed with status={status}, trying next backend.")
 
-    # REST fallback (minimal fields)
-    yield from _fish_tts_stream_rest(text, fmt, reference_id)
 
+async def fish_tts_stream_async(
+    text: str,
+    fmt: str = "mp3",
+    reference_id: Optional[str] = None,
+    speed: float = 1.0,
+    volume: int = 0,
+    latency: str = "balanced",
+    temperature: float = 0.7,
+    top_p: float = 0.7,
+):
+    """
+    Async twin of fish_tts_stream: same backend order, breakers and request
+    fields, so a line sounds the same on either path. REST streams natively
+    on the event loop; the SDK is blocking and runs in the threadpool (set
+    FISH_TTS_BACKENDS=rest,sdk to keep streams off worker threads).
+    """
+    starts = {
+        "sdk": lambda: iterate_in_threadpool(_fish_tts_stream_sdk(text, fmt, reference_id, speed, volume, latency)),
+        "rest": lambda: _afish_tts_stream_rest(text, fmt, reference_id),
+    }
+    backends = backend_order()
+
+    tried = 0
+    for i, name in enumerate(backends):
+        breaker = breakers[name]
+        last = i == len(backends) - 1
+        if not breaker.allow() and not (last and tried == 0):
+            continue
+        tried += 1
+        t0 = time.perf_counter()
+        sent = False
+        try:
+            async for chunk in starts[name]():
+                if not sent:
+                    breaker.record_success((time.perf_counter() - t0) * 1000.0)
+                    sent = True
+                yield chunk
+            return
+        except Exception as e:
+            if is_backend_failure(e):
+                breaker.record_failure(e)
+            if sent or last:
+                raise
+            status = getattr(e, "status", None) or getattr(e, "status_code", None)
+            print(f"[Fish async {name}] TTS failed with status={status}, trying next backend.")
+
+
+# ===================== Sentence-pipelined TTS =====================
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?…])[\"')\]]*\s+|\n+")
+_CLAUSE_SPLIT = re.compile(r"(?<=[,;:—])\s+")
+
+
+def split_tts_segments(
+    text: str,
+    min_chars: Optional[int] = None,
+    max_chars: Optional[int] = None,
+) -> List[str]:
+    """
+    Split text into sentences; sentences longer than max_chars are split again
+    on clause punctuation, and fragments shorter than min_chars are merged into
+    their neighbour so we don't synthesize choppy one-word segments.
+    """
+    min_chars = settings.FISH_TTS_PIPELINE_MIN_CHARS if min_chars is None else min_chars
+    max_chars = settings.FISH_TTS_PIPELINE_MAX_CHARS if max_chars is None else max_chars
+
+    pieces: List[str] = []
+    for sentence in _SENTENCE_SPLIT.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(sentence) > max_chars:
+            pieces.extend(c.strip() for c in _CLAUSE_SPLIT.split(sentence) if c.strip())
+        else:
+            pieces.append(sentence)
+
+    segments: List[str] = []
+    for piece in pieces:
+        if segments and len(segments[-1]) < min_chars:
+            segments[-1] = f"{segments[-1]} {piece}"
+        else:
+            segments.append(piece)
+    if len(segments) > 1 and len(segments[-1]) < min_chars:
+        tail = segments.pop()
+        segments[-1] = f"{segments[-1]} {tail}"
+    return segments
 
-def fish_asr(audio_bytes: bytes, language: str = "en"):
-    """Return ASR result (text, duration) using SDK or REST."""
+
+class PipelineStats:
+    """Per-segment timings so the split heuristics can be tuned from /healthz."""
+
+    def __init__(self) -> None:
+        self.utterances = 0
+        self.segments = 0
+        self.first_audio = LatencyWindow()    # request start -> first audio byte of the utterance
+        self.segment_ttfb = LatencyWindow()   # segment request -> its first byte
+        self.stall = LatencyWindow()          # playback waiting on a segment that wasn't ready
+        self.recent: "deque[list]" = deque(maxlen=20)
+
+    def record(self, segments: List[dict]) -> None:
+        self.utterances += 1
+        self.segments += len(segments)
+        if segments and segments[0].get("first_audio_ms") is not None:
+            self.first_audio.add(segments[0]["first_audio_ms"])
+        for seg in segments:
+            if seg.get("ttfb_ms") is not None:
+                self.segment_ttfb.add(seg["ttfb_ms"])
+            if seg.get("stall_ms") is not None:
+                self.stall.add(seg["stall_ms"])
+        self.recent.append(segments)
+
+    def snapshot(self) -> dict:
+        return {
+            "enabled_by_default": settings.FISH_TTS_PIPELINE,
+            "lookahead": settings.FISH_TTS_PIPELINE_LOOKAHEAD,
+            "utterances": self.utterances,
+            "segments": self.segments,
+            "first_audio": self.first_audio.snapshot(),
+            "segment_ttfb": self.segment_ttfb.snapshot(),
+            "stall": self.stall.snapshot(),
+            "recent": list(self.recent)[-5:],
+        }
+
+
+pipeline_stats = PipelineStats()
+
+
+async def fish_tts_stream_pipelined(
+    text: str,
+    fmt: str = "mp3",
+    lookahead: Optional[int] = None,
+    segment_stream=None,
+    **opts,
+):
+    """
+    Synthesize sentence segments concurrently (at most `lookahead` segments
+    ahead of the one being played) and stream them back in order as one audio
+    stream. Only mp3 frames concatenate cleanly, so other formats (wav has a
+    per-file header) and single-sentence text go through one request.
+    `segment_stream` is the per-segment async streamer (defaults to the raw
+    Fish async path; the service layer passes its cached variant).
+    """
+    segment_stream = segment_stream or fish_tts_stream_async
+    segments = split_tts_segments(text)
+    if len(segments) <= 1 or fmt != "mp3":
+        async for chunk in segment_stream(text=text, fmt=fmt, **opts):
+            yield chunk
+        return
+
+    lookahead = max(1, lookahead or settings.FISH_TTS_PIPELINE_LOOKAHEAD)
+    t0 = time.perf_counter()
+    queues = [asyncio.Queue() for _ in segments]
+    report = [{"index": i, "chars": len(seg)} for i, seg in enumerate(segments)]
+    tasks: List[asyncio.Task] = []
+
+    async def produce(i: int) -> None:
+        started = time.perf_counter()
+        report[i]["start_ms"] = round((started - t0) * 1000.0, 1)
+        size = 0
+        try:
+            async for chunk in segment_stream(text=segments[i], fmt=fmt, **opts):
+                if size == 0:
+                    report[i]["ttfb_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+                size += len(chunk)
+                queues[i].put_nowait(chunk)
+            report[i]["total_ms"] = round((time.perf_counter() - started) * 1000.0, 1)
+            report[i]["bytes"] = size
+            queues[i].put_nowait(None)
+        except Exception as e:
+            queues[i].put_nowait(e)
+
+    def start_next() -> None:
+        if len(tasks) < len(segments):
+            tasks.append(asyncio.create_task(produce(len(tasks))))
+
+    try:
+        for _ in range(lookahead):
+            start_next()
+        for i in range(len(segments)):
+            waited = time.perf_counter()
+            first = True
+            while True:
+                item = await queues[i].get()
+                if first:
+                    report[i]["stall_ms"] = round((time.perf_counter() - waited) * 1000.0, 1)
+                    if i == 0:
+                        report[i]["first_audio_ms"] = round((time.perf_counter() - t0) * 1000.0, 1)
+                    first = False
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+            # Segment i is fully played out: let one more segment start
+            start_next()
+        pipeline_stats.record(report)
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+
+
+def fish_asr(audio: Union[bytes, IO[bytes]], language: str = "en"):
+    """Return ASR result (text, duration) using SDK or REST; audio may be bytes or a file."""
     if FISH_MODE == "sdk":
-        session = Session(settings.FISH_API_KEY)
-        from fish_audio_sdk import ASRRequest  # type: ignore
+        session = get_sdk_session()
+        audio_bytes = audio if isinstance(audio, bytes) else audio.read()
         res = session.asr(ASRRequest(audio=audio_bytes, language=language))
         return {"text": res.text, "duration_ms": res.duration}
     else:
-        url = "https://api.fish.audio/v1/asr"
-        headers = {"Authorization": f"Bearer {settings.FISH_API_KEY}"}
         data = {"language": language, "ignore_timestamps": "true"}
-        files = {"audio": ("audio.wav", audio_bytes, "application/octet-stream")}
-        r = requests.post(url, headers=headers, data=data, files=files, timeout=120)
+        files = {"audio": ("audio.wav", audio, "application/octet-stream")}
+        r = fish_request("POST", "/v1/asr", data=data, files=files)
         r.raise_for_status()
         j = r.json()
         return {"text": j.get("text", ""), "duration_ms": int(j.get("duration", 0) * 1000) if "duration" in j else None}
+
+
+# Blocking ASR calls run here, never on the event loop
+asr_executor = BoundedExecutor("asr", settings.ASR_WORKERS, settings.ASR_MAX_QUEUE)
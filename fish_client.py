@@ -0,0 +1,274 @@
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+import httpx
+
+from config import settings
+from metrics import LatencyWindow
+
+# HTTP/2 needs the optional 'h2' package; without it httpx silently stays on HTTP/1.1.
+try:
+    import h2  # type: ignore  # noqa: F401
+    HTTP2_AVAILABLE = True
+except Exception:
+    HTTP2_AVAILABLE = False
+
+
+# ===================== Pool statistics =====================
+class PoolStats:
+    """
+    Counts requests vs. freshly opened connections using httpx's trace hook,
+    so we can see how many TCP/TLS handshakes keep-alive is saving us.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.http_versions: Dict[str, int] = {}
+        self.handshake = LatencyWindow()
+
+    def _on_trace(self, event_name: str, state: dict) -> None:
+        if event_name == "connection.connect_tcp.started":
+            state["t0"] = time.perf_counter()
+        elif event_name.endswith("send_request_headers.started") and "t0" in state:
+            # First request bytes on a brand-new connection: TCP + TLS (+ALPN) are done.
+            self.handshake.add((time.perf_counter() - state.pop("t0")) * 1000.0)
+            with self._lock:
+                self.connections_opened += 1
+
+    def tracer(self):
+        state: dict = {}
+
+        def trace(event_name: str, info: dict) -> None:
+            self._on_trace(event_name, state)
+
+        return trace
+
+    def async_tracer(self):
+        state: dict = {}
+
+        async def trace(event_name: str, info: dict) -> None:
+            self._on_trace(event_name, state)
+
+        return trace
+
+    def observe(self, response: httpx.Response) -> None:
+        with self._lock:
+            self.requests += 1
+            version = response.http_version or "unknown"
+            self.http_versions[version] = self.http_versions.get(version, 0) + 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            requests_ = self.requests
+            opened = self.connections_opened
+            versions = dict(self.http_versions)
+        reused = max(0, requests_ - opened)
+        handshake = self.handshake.snapshot()
+        mean = handshake["mean_ms"] or 0.0
+        return {
+            "requests": requests_,
+            "connections_opened": opened,
+            "connections_reused": reused,
+            "reuse_ratio": round(reused / requests_, 3) if requests_ else None,
+            "handshake": handshake,
+            "estimated_handshake_ms_saved": round(reused * mean, 1),
+            "http_versions": versions,
+        }
+
+
+stats = PoolStats()
+
+
+# ===================== Shared clients =====================
+_lock = threading.Lock()
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_sdk_session = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.FISH_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.FISH_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.FISH_POOL_KEEPALIVE_SEC,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        settings.FISH_READ_TIMEOUT_SEC,
+        connect=settings.FISH_CONNECT_TIMEOUT_SEC,
+        pool=settings.FISH_POOL_TIMEOUT_SEC,
+    )
+
+
+def _use_http2() -> bool:
+    return bool(settings.FISH_HTTP2 and HTTP2_AVAILABLE)
+
+
+def _attach_trace(request: httpx.Request) -> None:
+    request.extensions["trace"] = stats.tracer()
+
+
+def _event_hooks() -> dict:
+    return {"request": [_attach_trace], "response": [stats.observe]}
+
+
+async def _attach_trace_async(request: httpx.Request) -> None:
+    request.extensions["trace"] = stats.async_tracer()
+
+
+async def _observe_async(response: httpx.Response) -> None:
+    stats.observe(response)
+
+
+def get_client() -> httpx.Client:
+    """Process-wide keep-alive client for the Fish REST API."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(
+                    base_url=settings.FISH_API_BASE_URL,
+                    headers={"Authorization": f"Bearer {settings.FISH_API_KEY}"},
+                    limits=_limits(),
+                    timeout=_timeout(),
+                    http2=_use_http2(),
+                    event_hooks=_event_hooks(),
+                )
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Process-wide asyncio client (same pool settings); bound to the running event loop."""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            base_url=settings.FISH_API_BASE_URL,
+            headers={"Authorization": f"Bearer {settings.FISH_API_KEY}"},
+            limits=_limits(),
+            timeout=_timeout(),
+            http2=_use_http2(),
+            event_hooks={"request": [_attach_trace_async], "response": [_observe_async]},
+        )
+    return _async_client
+
+
+_sdk_streams = threading.local()
+
+
+class _SDKClient(httpx.Client):
+    """
+    Sync client handed to the Fish SDK. The SDK sends timeout=None on every
+    request, which httpx reads as "no timeout at all" (pool acquire included),
+    so that is mapped back to our client defaults. Streamed responses are
+    reported to sdk_stream(), which closes them; the SDK itself doesn't when
+    it raises on an error status or its generator is abandoned.
+    """
+
+    def build_request(self, *args, **kwargs) -> httpx.Request:
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = httpx.USE_CLIENT_DEFAULT
+        return super().build_request(*args, **kwargs)
+
+    def send(self, request: httpx.Request, *, stream: bool = False, **kwargs) -> httpx.Response:
+        response = super().send(request, stream=stream, **kwargs)
+        opened = getattr(_sdk_streams, "opened", None)
+        if stream and opened is not None:
+            opened.append(response)
+        return response
+
+
+def sdk_stream(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Iterate an SDK streaming call, returning its connection to the pool however iteration ends."""
+    responses: list = []
+    try:
+        _sdk_streams.opened = responses
+        try:
+            first = next(chunks)  # the SDK sends the request (and checks the status) here
+        except StopIteration:
+            return
+        finally:
+            _sdk_streams.opened = None
+        yield first
+        yield from chunks
+    finally:
+        chunks.close()
+        for response in responses:
+            response.close()
+
+
+def get_sdk_session():
+    """Process-wide Fish SDK session, with its sync client on our pool settings."""
+    global _sdk_session
+    if _sdk_session is None:
+        with _lock:
+            if _sdk_session is None:
+                from fish_audio_sdk import Session  # type: ignore
+
+                class PooledSession(Session):
+                    def init_sync_client(self):
+                        self._sync_client = _SDKClient(
+                            base_url=self._base_url,
+                            headers={"Authorization": f"Bearer {self._apikey}"},
+                            limits=_limits(),
+                            timeout=_timeout(),
+                            http2=_use_http2(),
+                            event_hooks=_event_hooks(),
+                        )
+
+                _sdk_session = PooledSession(settings.FISH_API_KEY, base_url=settings.FISH_API_BASE_URL)
+    return _sdk_session
+
+
+@contextmanager
+def fish_stream(method: str, path: str, **kwargs) -> Iterator[httpx.Response]:
+    """Streaming request on the shared client; the connection returns to the pool on exit."""
+    with get_client().stream(method, path, **kwargs) as r:
+        yield r
+
+
+def fish_request(method: str, path: str, **kwargs) -> httpx.Response:
+    return get_client().request(method, path, **kwargs)
+
+
+@asynccontextmanager
+async def afish_stream(method: str, path: str, **kwargs) -> AsyncIterator[httpx.Response]:
+    async with get_async_client().stream(method, path, **kwargs) as r:
+        yield r
+
+
+def close_clients() -> None:
+    global _client, _sdk_session
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+        if _sdk_session is not None:
+            _sdk_session._sync_client.close()
+            _sdk_session = None
+
+
+async def aclose_clients() -> None:
+    global _async_client
+    if _async_client is not None:
+        client, _async_client = _async_client, None
+        await client.aclose()
+    session = _sdk_session
+    if session is not None and getattr(session, "_async_client", None) is not None:
+        await session._async_client.aclose()  # the SDK opens its own AsyncClient too
+    close_clients()
+
+
+def pool_stats() -> dict:
+    return {
+        "http2_enabled": _use_http2(),
+        "max_connections": settings.FISH_POOL_MAX_CONNECTIONS,
+        "max_keepalive": settings.FISH_POOL_MAX_KEEPALIVE,
+        "keepalive_sec": settings.FISH_POOL_KEEPALIVE_SEC,
+        **stats.snapshot(),
+    }
@@ -0,0 +1,165 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# ===================== Intent table =====================
+# Checked in priority order: when a message matches several intents, the
+# earliest entry wins. Keywords match whole words/phrases, case-insensitively.
+INTENTS: List[Tuple[str, Sequence[str]]] = [
+    ("greeting", ["hello", "hi", "hey", "good morning", "good afternoon"]),
+    ("stuck", ["help", "stuck", "confused", "don't know"]),
+    ("tired", ["tired", "exhausted", "burned out"]),
+    ("done", ["done", "finished", "completed", "accomplished"]),
+    ("focus", ["focus", "focusing", "concentrate", "work", "working", "study", "studying"]),
+]
+
+DEFAULT_INTENT = "generic"
+
+# intent -> personality id (or "default") -> candidate replies.
+# "default" replies get the personality's fallback prefix/suffix applied;
+# personality-specific ones are already written in that voice.
+RESPONSES: Dict[str, Dict[str, List[str]]] = {
+    "greeting": {
+        "default": [
+            "Hey there! Ready to tackle something today?",
+            "Hi! What's on your mind?",
+            "Hello! How can I help you stay focused?",
+            "Hey! What's your priority right now?",
+        ],
+        "pushy": [
+            "Hi. Skip the small talk—what are you working on?",
+            "Hey. What's the one task you've been dodging?",
+        ],
+    },
+    "stuck": {
+        "default": [
+            "Let's break this down into smaller pieces.",
+            "What's the smallest step you can take right now?",
+            "I'm here to help! What's feeling overwhelming?",
+            "Let's tackle this one piece at a time.",
+        ],
+        "funny": [
+            "Stuck? Classic. Name the tiniest possible step—smaller. No, smaller. 😏",
+            "Confusion is just procrastination in a trench coat. What's step one?",
+        ],
+    },
+    "tired": {
+        "default": [
+            "Take a moment to breathe. You're doing great.",
+            "Rest is productive too. What would help you recharge?",
+            "It's okay to slow down. What's one tiny thing you can do?",
+            "You've been working hard. How about a short break?",
+        ],
+    },
+    "done": {
+        "default": [
+            "Awesome! That's a win worth celebrating.",
+            "Great job! What's next on your list?",
+            "You did it! How does that feel?",
+            "Nice work! Ready for the next challenge?",
+        ],
+        "pushy": [
+            "Good. Don't get comfortable—what's next?",
+            "Done is done. Pick the next task before the momentum fades.",
+        ],
+    },
+    "focus": {
+        "default": [
+            "Let's set up a focused work session.",
+            "What's your main goal for this focus time?",
+            "Ready to dive in? What's your first step?",
+            "Let's create some momentum together.",
+        ],
+    },
+    DEFAULT_INTENT: {
+        "default": [
+            "I'm listening! Tell me more about what's on your mind.",
+            "What's the most important thing right now?",
+            "How can I support you today?",
+            "What would help you feel more confident?",
+            "Let's figure this out together.",
+            "What's your next small step?",
+        ],
+    },
+}
+
+
+def _normalize(phrase: str) -> str:
+    return " ".join(phrase.replace("’", "'").split())
+
+
+def _trie_pattern(phrases: Sequence[str]) -> str:
+    """
+    Alternation factored on common prefixes (hel(?:lo|p) rather than hello|help),
+    so the regex engine tests one branch per leading character instead of
+    every keyword at every position.
+    """
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for word_i, word in enumerate(phrase.split()):
+            if word_i:
+                node = node.setdefault(" ", {})
+            for ch in word:
+                node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        alts = []
+        for ch in sorted(k for k in node if k):
+            if ch == " ":
+                head = r"\s+"
+            elif ch == "'":
+                head = "['’]"
+            else:
+                head = re.escape(ch)
+            alts.append(head + build(node[ch]))
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else "(?:" + "|".join(alts) + ")"
+        if "" in node:
+            body = f"(?:{body})?"
+        return body
+
+    return build(trie)
+
+
+# ===================== Matcher =====================
+class IntentMatcher:
+    """
+    All keywords of all intents in one compiled, word-bounded, prefix-factored
+    alternation, run once over the lowercased text; each hit maps back to its
+    intent and the highest-priority one wins.
+    """
+
+    def __init__(self, intents: Sequence[Tuple[str, Sequence[str]]]) -> None:
+        self.names = [name for name, _ in intents]
+        self._intent_of: Dict[str, int] = {}
+        for i, (_, phrases) in enumerate(intents):
+            for phrase in phrases:
+                self._intent_of.setdefault(_normalize(phrase.lower()), i)
+        self._pattern = re.compile(r"\b" + _trie_pattern(list(self._intent_of)) + r"\b")
+
+    def match(self, text: str) -> Optional[str]:
+        """Highest-priority intent mentioned anywhere in text, or None."""
+        best = len(self.names)
+        for hit in self._pattern.findall(text.lower()):
+            if " " in hit or "’" in hit or "\t" in hit or "\n" in hit:
+                hit = _normalize(hit)
+            i = self._intent_of.get(hit, best)
+            if i < best:
+                best = i
+                if best == 0:
+                    break
+        return self.names[best] if best < len(self.names) else None
+
+
+intent_matcher = IntentMatcher(INTENTS)
+
+
+def responses_for(intent: Optional[str], personality_id: str) -> Tuple[List[str], bool]:
+    """(candidate replies, already_in_voice) for an intent and personality."""
+    table = RESPONSES.get(intent or DEFAULT_INTENT, RESPONSES[DEFAULT_INTENT])
+    if personality_id in table:
+        return table[personality_id], True
+    return table["default"], False
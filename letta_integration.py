@@ -1,12 +1,16 @@
-from typing import Optional
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+import asyncio
 import os
+import random
 import requests
 from letta_client import Letta  # per your Letta development guidelines
 
 from config import settings
 from models import Personality
-from personalities import personality_style_prompt
+from personalities import personality_style_prompt, apply_personality_text
+from intents import intent_matcher, responses_for
 from database import update_account_agent_id
+from executors import BoundedExecutor, ExecutorBusy
 
 
 # ===================== Letta client =====================
@@ -50,7 +54,7 @@ def create_letta_agent(username: str) -> Optional[str]:
         }
         
         print(f"[DEBUG] Calling Letta API directly: {url}")
-        response = requests.post(url, headers=headers)
+        response = requests.post(url, headers=headers, timeout=settings.LETTA_CREATE_TIMEOUT_SEC)
         
         if response.status_code != 201:
             print(f"[ERROR] API call failed with status {response.status_code}: {response.text}")
@@ -131,61 +135,118 @@ def letta_generate_single(
     return ""
 
 
+# ===================== Off-loop access =====================
+# Letta calls are blocking HTTP; async code runs them here so the event loop
+# (WebSocket sends, timers, follow-up scans) never waits on an LLM reply.
+letta_executor = BoundedExecutor("letta", settings.LETTA_WORKERS, settings.LETTA_MAX_QUEUE)
+
+
+async def run_letta(fn: Callable[..., Any], *args, timeout: Optional[float] = None, default: Any = None, **kwargs) -> Any:
+    """
+    Run a blocking Letta call on letta_executor. Returns `default` when the
+    pool is saturated or the call outlives `timeout` (the call itself keeps
+    running in its worker); other errors propagate.
+    """
+    try:
+        return await letta_executor.run(fn, *args, timeout=timeout or settings.LETTA_TIMEOUT_SEC, **kwargs)
+    except ExecutorBusy:
+        print(f"[WARNING] Letta executor busy, skipping {getattr(fn, '__name__', fn)}")
+    except asyncio.TimeoutError:
+        print(f"[WARNING] Letta call {getattr(fn, '__name__', fn)} timed out")
+    return default
+
+
+async def aletta_generate_single(
+    content: str,
+    personality: Optional[Personality] = None,
+    agent_id: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> str:
+    """Async letta_generate_single; "" (use fallback copy) on timeout or overload."""
+    return await run_letta(letta_generate_single, content, personality, agent_id, timeout=timeout, default="")
+
+
+def content_text(content: Any) -> str:
+    """Assistant content is a str, or (newer servers) a list of content parts."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(getattr(part, "text", "") or "" for part in content)
+    return ""
+
+
+def letta_stream_single(
+    content: str,
+    personality: Optional[Personality] = None,
+    agent_id: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Streaming twin of letta_generate_single: yields assistant text as Letta
+    produces it (token deltas when the server supports token streaming,
+    otherwise whole steps). Yields nothing when Letta isn't available.
+    """
+    if not agent_id or not letta:
+        return
+    prompt = content
+    if personality:
+        instruction = personality_style_prompt(
+            personality,
+            "Respond in that persona. Keep it warm, actionable, and under ~20 words.",
+        )
+        prompt = (
+            f"{instruction}\n\nUser message: {content}\nAssistant:"
+        )
+    messages_api = letta.agents.messages
+    # letta_client renamed create_stream -> stream between releases
+    stream_fn = getattr(messages_api, "create_stream", None) or messages_api.stream
+    stream = stream_fn(
+        agent_id=agent_id,
+        messages=[{"role": "user", "content": prompt}],
+        stream_tokens=True,
+    )
+    for chunk in stream:
+        if getattr(chunk, "message_type", "") == "assistant_message":
+            text = content_text(getattr(chunk, "content", ""))
+            if text:
+                yield text
+
+
+def _close_quietly(it: Iterator[str]) -> None:
+    try:
+        it.close()
+    except Exception:
+        pass  # e.g. a timed-out step is still running in another worker
+
+
+async def aletta_stream_single(
+    content: str,
+    personality: Optional[Personality] = None,
+    agent_id: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """
+    letta_stream_single driven from letta_executor, one step per job, so no
+    thread is parked for the whole reply. Each step gets `timeout`; timeouts,
+    overload and errors propagate so the caller can fall back.
+    """
+    it = letta_stream_single(content, personality, agent_id)
+    done = object()
+    try:
+        while True:
+            text = await letta_executor.run(next, it, done, timeout=timeout or settings.LETTA_TIMEOUT_SEC)
+            if text is done:
+                return
+            yield text
+    finally:
+        # Closes the underlying HTTP stream; never blocks the loop on it
+        letta_executor.submit(_close_quietly, it)
+
+
 def generate_fallback_response(user_text: str, personality: Personality) -> str:
     """Generate varied fallback responses when Letta is unavailable."""
-    import random
-    
-    # Simple keyword-based responses
-    user_lower = user_text.lower()
-    
-    responses = []
-    
-    if any(word in user_lower for word in ["hello", "hi", "hey", "good morning", "good afternoon"]):
-        responses = [
-            "Hey there! Ready to tackle something today?",
-            "Hi! What's on your mind?",
-            "Hello! How can I help you stay focused?",
-            "Hey! What's your priority right now?"
-        ]
-    elif any(word in user_lower for word in ["help", "stuck", "confused", "don't know"]):
-        responses = [
-            "Let's break this down into smaller pieces.",
-            "What's the smallest step you can take right now?",
-            "I'm here to help! What's feeling overwhelming?",
-            "Let's tackle this one piece at a time."
-        ]
-    elif any(word in user_lower for word in ["tired", "exhausted", "burned out"]):
-        responses = [
-            "Take a moment to breathe. You're doing great.",
-            "Rest is productive too. What would help you recharge?",
-            "It's okay to slow down. What's one tiny thing you can do?",
-            "You've been working hard. How about a short break?"
-        ]
-    elif any(word in user_lower for word in ["done", "finished", "completed", "accomplished"]):
-        responses = [
-            "Awesome! That's a win worth celebrating.",
-            "Great job! What's next on your list?",
-            "You did it! How does that feel?",
-            "Nice work! Ready for the next challenge?"
-        ]
-    elif any(word in user_lower for word in ["focus", "concentrate", "work", "study"]):
-        responses = [
-            "Let's set up a focused work session.",
-            "What's your main goal for this focus time?",
-            "Ready to dive in? What's your first step?",
-            "Let's create some momentum together."
-        ]
-    else:
-        # Generic encouraging responses
-        responses = [
-            "I'm listening! Tell me more about what's on your mind.",
-            "What's the most important thing right now?",
-            "How can I support you today?",
-            "What would help you feel more confident?",
-            "Let's figure this out together.",
-            "What's your next small step?"
-        ]
-    
-    chosen_response = random.choice(responses)
-    from personalities import apply_personality_text
+    intent = intent_matcher.match(user_text)
+    candidates, in_voice = responses_for(intent, personality.id)
+    chosen_response = random.choice(candidates)
+    if in_voice:
+        return chosen_response
     return apply_personality_text(personality, chosen_response)
@@ -0,0 +1,180 @@
+import asyncio
+import random
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from letta_integration import aletta_generate_single
+from models import Personality, PomodoroPhase
+from personalities import PERSONALITIES, get_personality, personality_style_prompt
+
+
+REMINDER_INSTRUCTION = (
+    "You are a supportive, ADHD‑friendly companion coach. "
+    "Respond in ONE short, conversational English sentence (max ~20 words), friendly and positive."
+)
+
+
+def reminder_situation(phase, minutes) -> str:
+    """What just happened, in prompt form (also used when several events are merged)."""
+    if phase == PomodoroPhase.FOCUS_START:
+        return (
+            f"We're starting a {minutes}-minute focus block; give a kickoff encouragement, "
+            "and mention you'll gently check in later if they don't reply."
+        )
+    if phase == PomodoroPhase.BREAK_START:
+        return f"Focus just ended; starting a {minutes}-minute break—offer a quick relaxation tip."
+    if phase == PomodoroPhase.CYCLE_END:
+        return "This round is complete; give praise and ask if they want to continue."
+    return "All pomodoros are done today; celebrate and offer a short wrap‑up tip."
+
+
+def reminder_prompt(personality: Personality, phase, minutes) -> str:
+    """Letta prompt for a Pomodoro transition; identical for every user with this personality."""
+    base = personality_style_prompt(personality, REMINDER_INSTRUCTION)
+    return f"{base} {reminder_situation(phase, minutes)}"
+
+
+LineKey = Tuple[str, str, Optional[int]]  # (personality id, phase, minutes)
+
+
+def line_key(personality: Personality, phase, minutes) -> LineKey:
+    try:
+        phase = PomodoroPhase(phase)
+    except ValueError:
+        phase = PomodoroPhase.ALL_DONE  # reminder_prompt's catch-all
+    if phase in (PomodoroPhase.CYCLE_END, PomodoroPhase.ALL_DONE):
+        minutes = None  # not part of the prompt
+    return personality.id, phase.value, int(minutes) if minutes is not None else None
+
+
+class _Line:
+    __slots__ = ("text", "uses")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.uses = 0
+
+
+# ===================== Pre-generated phase lines =====================
+class LinePool:
+    """
+    Per-(personality, phase, minutes) pools of Letta-written Pomodoro lines,
+    generated on the shared LETTA_AGENT_ID agent in the background and served
+    at random on the hot path. Only the prewarmed keys (every personality and
+    phase at LINE_POOL_FOCUS_MIN / LINE_POOL_BREAK_MIN) are kept, so custom
+    session lengths can't grow the set of refilled keys. A line retires after
+    LINE_POOL_MAX_USES serves so the pool keeps rotating; an empty or unknown
+    pool is a miss and the caller generates per user as before.
+    """
+
+    def __init__(self, size: int, max_uses: int, refill_interval_sec: float) -> None:
+        self.size = size
+        self.max_uses = max_uses
+        self.refill_interval = refill_interval_sec
+        self._pools: "OrderedDict[LineKey, List[_Line]]" = OrderedDict()
+        self._wake: Optional[asyncio.Event] = None
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failures = 0
+        self.duplicates = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.LINE_POOL_ENABLED and settings.LETTA_AGENT_ID)
+
+    def take(self, personality: Personality, phase, minutes) -> Optional[str]:
+        if not self.enabled:
+            return None
+        key = line_key(personality, phase, minutes)
+        pool = self._pools.get(key)
+        if not pool:
+            self.misses += 1
+            if pool is not None:
+                self._kick()
+            return None
+        line = random.choice(pool)
+        line.uses += 1
+        if line.uses >= self.max_uses:
+            pool.remove(line)
+        if len(pool) < self.size:
+            self._kick()
+        self.hits += 1
+        return line.text
+
+    def prewarm(self, minutes: Dict[str, int]) -> None:
+        """Register the default-length phases for every personality."""
+        for personality in PERSONALITIES.values():
+            for phase in PomodoroPhase:
+                key = line_key(personality, phase, minutes.get(phase.value))
+                self._pools.setdefault(key, [])
+
+    def _kick(self) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    def _neediest(self) -> Optional[LineKey]:
+        key, pool = min(self._pools.items(), key=lambda kv: len(kv[1]), default=(None, None))
+        if key is None or len(pool) >= self.size:
+            return None
+        return key
+
+    async def _generate(self, key: LineKey) -> bool:
+        personality_id, phase, minutes = key
+        personality = get_personality(personality_id)
+        prompt = reminder_prompt(personality, PomodoroPhase(phase), minutes)
+        try:
+            text = (await aletta_generate_single(
+                prompt, personality=personality, agent_id=settings.LETTA_AGENT_ID,
+            )).strip()
+        except Exception as e:
+            print(f"[LinePool] generation failed for {key}: {e}")
+            text = ""
+        if not text:
+            self.failures += 1
+            return False
+        pool = self._pools.setdefault(key, [])
+        if any(line.text == text for line in pool):
+            self.duplicates += 1
+            return False
+        pool.append(_Line(text))
+        self.generated += 1
+        return True
+
+    async def run(self) -> None:
+        """Background refill loop (started from app startup)."""
+        if not self.enabled:
+            return
+        self._wake = asyncio.Event()
+        self.prewarm({
+            PomodoroPhase.FOCUS_START.value: settings.LINE_POOL_FOCUS_MIN,
+            PomodoroPhase.BREAK_START.value: settings.LINE_POOL_BREAK_MIN,
+        })
+        while True:
+            key = self._neediest()
+            if key is None:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            added = await self._generate(key)
+            # Back off harder while Letta is failing or repeating itself
+            await asyncio.sleep(max(self.refill_interval, 0.5) * 5 if not added else self.refill_interval)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "keys": len(self._pools),
+            "lines": sum(len(p) for p in self._pools.values()),
+            "target_per_key": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "generated": self.generated,
+            "failures": self.failures,
+            "duplicates": self.duplicates,
+        }
+
+
+line_pool = LinePool(settings.LINE_POOL_SIZE, settings.LINE_POOL_MAX_USES, settings.LINE_POOL_REFILL_INTERVAL_SEC)
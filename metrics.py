@@ -0,0 +1,57 @@
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+
+# ===================== Latency samples =====================
+def _pick(ordered, q: float) -> Optional[float]:
+    if not ordered:
+        return None
+    idx = min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class LatencyWindow:
+    """
+    Rolling window of latency samples (milliseconds).
+    Keeps lifetime count/mean plus percentiles over the most recent samples.
+    """
+
+    def __init__(self, size: int = 512) -> None:
+        self._samples: "deque[float]" = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+
+    def add(self, ms: float) -> None:
+        with self._lock:
+            self._samples.append(ms)
+            self.count += 1
+            self.total_ms += ms
+
+    @property
+    def mean_ms(self) -> Optional[float]:
+        return (self.total_ms / self.count) if self.count else None
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._samples)
+        return _pick(ordered, q)
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            ordered = sorted(self._samples)
+
+        def pick(q: float) -> Optional[float]:
+            value = _pick(ordered, q)
+            return round(value, 2) if value is not None else None
+
+        mean = self.mean_ms
+        return {
+            "count": self.count,
+            "mean_ms": round(mean, 2) if mean is not None else None,
+            "p50_ms": pick(50),
+            "p95_ms": pick(95),
+            "p99_ms": pick(99),
+            "max_ms": round(ordered[-1], 2) if ordered else None,
+        }
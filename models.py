@@ -1,7 +1,8 @@
+import time
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field
 
 
 # ===================== Personalities =====================
@@ -33,6 +34,7 @@ class Event(BaseModel):
     type: EventType
     user_id: str
     data: dict = {}
+    created_at: float = Field(default_factory=time.monotonic, exclude=True)  # for end-to-end latency
 
 
 # ===================== User preferences =====================
@@ -52,6 +54,19 @@ class SayIn(BaseModel):
     top_p: Optional[float] = 0.7
     format: Optional[str] = "mp3"
     user_id: Optional[str] = None
+    pipelined: Optional[bool] = None  # None -> settings.FISH_TTS_PIPELINE
+
+
+class SayBatchIn(BaseModel):
+    lines: List[str]
+    reference_id: Optional[str] = None
+    speed: Optional[float] = 1.0
+    volume: Optional[int] = 0
+    latency: Optional[str] = "balanced"
+    temperature: Optional[float] = 0.7
+    top_p: Optional[float] = 0.7
+    format: Optional[str] = "mp3"
+    user_id: Optional[str] = None
 
 
 # ===================== Composio Gmail integration =====================
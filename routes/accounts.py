@@ -4,8 +4,9 @@ import sqlite3
 
 from models import AccountCreateIn, AccountLoginIn, VoiceModelUpdateIn, UserPrefs
 from database import get_account, store_account, verify_password, update_account_voice_model
-from letta_integration import create_letta_agent
+from agent_pool import agent_pool
 from shared_state import user_prefs
+from voice_catalog import validate_voice_model
 
 router = APIRouter(prefix="/accounts", tags=["accounts"])
 
@@ -18,8 +19,9 @@ def register_account(payload: AccountCreateIn):
     if get_account(username):
         return JSONResponse({"error": "username_taken"}, status_code=409)
     try:
-        agent_id = create_letta_agent(username)
-        account = store_account(username, payload.password, payload.voice_model, agent_id)
+        account = store_account(username, payload.password, payload.voice_model)
+        # Pre-created agent if one is ready; otherwise the pool binds one shortly
+        account["letta_agent_id"] = agent_pool.claim(username)
     except sqlite3.IntegrityError:
         return JSONResponse({"error": "username_taken"}, status_code=409)
     except Exception as exc:
@@ -65,5 +67,8 @@ def update_voice_model(username: str, payload: VoiceModelUpdateIn):
     voice_model = payload.voice_model.strip()
     if not voice_model:
         return JSONResponse({"error": "invalid_voice_model"}, status_code=400)
+    error = validate_voice_model(voice_model)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
     update_account_voice_model(username, voice_model)
     return {"ok": True, "username": username, "voice_model": voice_model}
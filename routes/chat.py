@@ -1,12 +1,15 @@
+import json
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from typing import Optional
 
 from models import ChatIn, UserPrefs
 from personalities import get_personality
-from letta_integration import letta_generate_single, generate_fallback_response, letta
-from websocket import ensure_user_has_agent, schedule_followup, cancel_followup
-from database import get_account
+from letta_integration import letta_generate_single, generate_fallback_response, aletta_stream_single
+from websocket import ensure_user_has_agent, aensure_user_has_agent, schedule_followup, cancel_followup
+from database import get_account, list_chat_messages, utc_iso
+from chat_history import chat_sync, decode_cursor, encode_cursor, record_turn
 from config import settings
 from shared_state import user_prefs
 
@@ -20,9 +23,11 @@ def chat_send(payload: ChatIn):
       1) cancel any pending follow-up,
       2) ensure user has a Letta agent (create if needed),
       3) ask Letta for a single reply,
-      4) schedule a new one-shot follow-up if the user doesn't reply in time.
+      4) schedule a new one-shot follow-up if the user doesn't reply in time,
+      5) store both turns in the local chat history.
     """
     cancel_followup(payload.user_id)
+    asked_at = utc_iso()
 
     prefs = user_prefs.get(payload.user_id, UserPrefs())
     personality = get_personality(prefs.personality_id)
@@ -34,14 +39,16 @@ def chat_send(payload: ChatIn):
     # Ask Letta for a short English reply (fallback if Letta unavailable).
     prompt = payload.text.strip()
     reply = ""
-    if prompt:
-        reply = letta_generate_single(prompt, personality=personality, agent_id=agent_id) or ""
-        print(f"[DEBUG] Letta response: '{reply}', agent_id: {agent_id}")
+    with chat_sync.turn(payload.user_id):
+        if prompt:
+            reply = letta_generate_single(prompt, personality=personality, agent_id=agent_id) or ""
+            print(f"[DEBUG] Letta response: '{reply}', agent_id: {agent_id}")
 
-    if not reply:
-        print(f"[DEBUG] Using fallback response for: '{prompt}'")
-        reply = generate_fallback_response(prompt, personality)
-        print(f"[DEBUG] Fallback response: '{reply}'")
+        if not reply:
+            print(f"[DEBUG] Using fallback response for: '{prompt}'")
+            reply = generate_fallback_response(prompt, personality)
+            print(f"[DEBUG] Fallback response: '{reply}'")
+        record_turn(payload.user_id, prompt, reply, asked_at)
 
     # One-shot follow-up timer
     schedule_followup(payload.user_id, settings.FOLLOWUP_DELAY_SEC)
@@ -54,89 +61,136 @@ def chat_send(payload: ChatIn):
         "voice_model": account.get("voice_model") if account else None,
     }
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/stream")
+async def chat_stream(payload: ChatIn):
+    """
+    Same flow as /chat/send, but the reply is streamed as Server-Sent Events:
+      event: delta  data: {"text": "<next piece of the reply>"}   (repeated)
+      event: done   data: {"text": <full reply>, "voice_suggested", "personality", "voice_model", "fallback"}
+    If Letta fails before producing any text, the fallback reply is sent as one delta.
+    Both turns are stored in the local chat history before `done` is sent.
+    """
+    cancel_followup(payload.user_id)
+    asked_at = utc_iso()
+
+    prefs = user_prefs.get(payload.user_id, UserPrefs())
+    personality = get_personality(prefs.personality_id)
+    agent_id = await aensure_user_has_agent(payload.user_id)
+    account = await run_in_threadpool(get_account, payload.user_id)
+    prompt = payload.text.strip()
+
+    async def events():
+        parts = []
+        error = None
+        reply = None
+        recorded = False
+        with chat_sync.turn(payload.user_id):
+            try:
+                if prompt:
+                    try:
+                        async for text in aletta_stream_single(prompt, personality=personality, agent_id=agent_id):
+                            parts.append(text)
+                            yield _sse("delta", {"text": text})
+                    except Exception as e:
+                        error = str(e) or type(e).__name__
+                        print(f"[Chat Stream Error] {payload.user_id}: {error}")
+
+                reply = "".join(parts).strip()
+                fallback = not reply
+                if fallback:
+                    reply = generate_fallback_response(prompt, personality)
+                    yield _sse("delta", {"text": reply})
+                await run_in_threadpool(record_turn, payload.user_id, prompt, reply, asked_at)
+                recorded = True
+            finally:
+                if not recorded:
+                    # Client went away mid-stream and we may be cancelled, so write
+                    # inline: Letta already has the exchange, keep what we have of it
+                    partial = reply if reply is not None else "".join(parts).strip()
+                    try:
+                        record_turn(payload.user_id, prompt, partial, asked_at)
+                    except Exception as e:
+                        print(f"[Chat Stream Error] {payload.user_id}: storing turn failed: {e}")
+
+        # One-shot follow-up timer
+        schedule_followup(payload.user_id, settings.FOLLOWUP_DELAY_SEC)
+        done = {
+            "text": reply,
+            "voice_suggested": bool(prefs.voice_enabled),
+            "personality": personality.id,
+            "voice_model": account.get("voice_model") if account else None,
+            "fallback": fallback,
+        }
+        if error:
+            done["error"] = error
+        yield _sse("done", done)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/history/{user_id}")
-def get_chat_history(
+async def get_chat_history(
     user_id: str,
     limit: Optional[int] = 50,
-    order: str = "desc"
+    order: str = "desc",
+    before: Optional[str] = None,
+    after: Optional[str] = None,
 ):
     """
-    Get chat history for a user from their Letta agent.
+    Chat history from the local index. Only a user's first read waits on
+    Letta, to import what it already holds (bounded by CHAT_BACKFILL_TIMEOUT_SEC).
+
+    Without cursors this is the newest `limit` messages. `before` pages back
+    from a previous response's `before` cursor; `after` returns the oldest
+    messages newer than an `after` cursor (polling for new ones). `order`
+    only sorts the returned page. `has_more` is True when the same request
+    with the returned cursor would yield more in that direction.
     """
+    limit = max(1, min(limit or 50, settings.CHAT_HISTORY_MAX_LIMIT))
     try:
-        # Get user's agent ID
-        account = get_account(user_id)
-        if not account or not account.get("letta_agent_id"):
-            return {"messages": [], "error": "No agent found for user"}
-        
-        agent_id = account["letta_agent_id"]
-        
-        # Get messages from Letta
-        if not letta:
-            return {"messages": [], "error": "Letta not configured"}
-        
-        try:
-            # Use Letta client to get message history (without order parameter)
-            response = letta.agents.messages.list(
-                agent_id=agent_id,
-                limit=limit
-            )
-            
-            # Check if response is a list or an object with messages attribute
-            if isinstance(response, list):
-                message_list = response
-            else:
-                message_list = getattr(response, "messages", [])
-            
-            messages = []
-            for msg in message_list:
-                message_type = getattr(msg, "message_type", "unknown")
-                content = getattr(msg, "content", "")
-                
-                # Only include user and assistant messages, skip system/reasoning/tool messages
-                if message_type in ["user_message", "assistant_message"]:
-                    # For user messages, extract just the actual user message
-                    if message_type == "user_message":
-                        role = "user"
-                        # Extract the actual user message from the formatted prompt
-                        if "User message: " in content:
-                            # Extract text after "User message: " and before any "Assistant:" marker
-                            user_msg = content.split("User message: ")[-1].split("\nAssistant:")[0].strip()
-                            display_content = user_msg
-                        else:
-                            display_content = content
-                    elif message_type == "assistant_message":
-                        role = "assistant"
-                        display_content = content
-                    else:
-                        role = message_type
-                        display_content = content
-                    
-                    messages.append({
-                        "role": role,
-                        "content": display_content,
-                        "timestamp": getattr(msg, "created_at", None) or getattr(msg, "date", None),
-                        "message_type": message_type
-                    })
-            
-            # Sort messages manually based on timestamp
-            if order == "desc":
-                messages.sort(key=lambda x: x["timestamp"] or "1970-01-01T00:00:00Z", reverse=True)
-            else:  # asc
-                messages.sort(key=lambda x: x["timestamp"] or "1970-01-01T00:00:00Z", reverse=False)
-            
-            return {
-                "messages": messages,
-                "agent_id": agent_id,
-                "count": len(messages)
-            }
-            
-        except Exception as e:
-            print(f"[ERROR] Failed to fetch Letta messages: {e}")
-            import traceback
-            traceback.print_exc()
-            return {"messages": [], "error": f"Failed to fetch messages: {str(e)}"}
-            
-    except Exception as e:
-        print(f"[ERROR] Chat history error: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to get chat history: {str(e)}")
+        before_key = decode_cursor(before) if before else None
+        after_key = decode_cursor(after) if after else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    account = await run_in_threadpool(get_account, user_id)
+    if not account:
+        return {"messages": [], "count": 0, "has_more": False, "error": "No account found for user"}
+
+    await chat_sync.backfill(user_id)
+    rows = await run_in_threadpool(list_chat_messages, user_id, limit + 1, before_key, after_key)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.sort(key=lambda r: (r["created_at"], r["id"]), reverse=(order == "desc"))
+
+    # Keep following this user so anything that reaches Letta some other way shows up
+    chat_sync.touch(user_id, sync_now=not (before or after))
+
+    messages = [
+        {
+            "id": row["id"],
+            "role": row["role"],
+            "content": row["content"],
+            "timestamp": row["created_at"],
+            "message_type": f"{row['role']}_message",
+        }
+        for row in rows
+    ]
+    oldest = min(rows, key=lambda r: (r["created_at"], r["id"]), default=None)
+    newest = max(rows, key=lambda r: (r["created_at"], r["id"]), default=None)
+    return {
+        "messages": messages,
+        "agent_id": account.get("letta_agent_id"),
+        "count": len(messages),
+        "has_more": has_more,
+        "before": encode_cursor(oldest["created_at"], oldest["id"]) if oldest else before,
+        "after": encode_cursor(newest["created_at"], newest["id"]) if newest else after,
+    }
@@ -1,6 +1,18 @@
 from fastapi import APIRouter
 
-from fish_audio import FISH_MODE
+from fish_audio import FISH_MODE, asr_executor, breaker_stats, pipeline_stats
+from fish_client import pool_stats
+from tts_cache import tts_cache
+from tts_service import singleflight_stats
+from audio_preprocess import preprocess_stats
+from voice_catalog import voice_catalog
+from admission import tts_admission
+from letta_integration import letta_executor
+from websocket import orchestrator_snapshot, deadline_stats
+from agent_pool import agent_pool
+from line_pool import line_pool
+from chat_history import chat_sync
+from database import account_cache, db_stats
 
 router = APIRouter(tags=["health"])
 
@@ -8,4 +20,24 @@ router = APIRouter(tags=["health"])
 @router.get("/healthz")
 def healthz():
     mode = "FishSDK" if FISH_MODE == "sdk" else "FishREST"
-    return {"ok": True, "voice_backend": mode}
+    return {
+        "ok": True,
+        "voice_backend": mode,
+        "fish_breakers": breaker_stats(),
+        "fish_pool": pool_stats(),
+        "tts_cache": tts_cache.stats(),
+        "tts_pipeline": pipeline_stats.snapshot(),
+        "tts_singleflight": singleflight_stats(),
+        "tts_admission": tts_admission.stats(),
+        "asr": asr_executor.stats(),
+        "asr_preprocess": preprocess_stats.snapshot(),
+        "voice_catalog": voice_catalog.stats(),
+        "letta": letta_executor.stats(),
+        "agent_pool": agent_pool.stats(),
+        "line_pool": line_pool.stats(),
+        "chat_sync": chat_sync.stats(),
+        "db": db_stats(),
+        "account_cache": account_cache.stats(),
+        "orchestrator": orchestrator_snapshot(),
+        "letta_deadlines": deadline_stats.snapshot(),
+    }
@@ -5,6 +5,7 @@ from models import VoiceToggleIn, PersonalitySetIn, UserPrefs, VoiceModelUpdateI
 from personalities import get_personality, PERSONALITIES, DEFAULT_PERSONALITY_ID
 from database import get_account, update_account_voice_model
 from shared_state import user_prefs
+from voice_catalog import validate_voice_model
 
 router = APIRouter(prefix="/prefs", tags=["preferences"])
 
@@ -73,12 +74,18 @@ def set_personality_pref(user_id: str, payload: PersonalitySetIn):
 @router.post("/{user_id}/voice-model")
 def set_voice_model_pref(user_id: str, payload: VoiceModelUpdateIn):
     """Set the voice model preference for a user"""
+    voice_model = payload.voice_model.strip()
+    if not voice_model:
+        return JSONResponse({"error": "invalid_voice_model"}, status_code=400)
+    error = validate_voice_model(voice_model)
+    if error:
+        return JSONResponse({"error": error}, status_code=400)
     try:
-        update_account_voice_model(user_id, payload.voice_model)
+        update_account_voice_model(user_id, voice_model)
         return {
             "ok": True,
             "user_id": user_id,
-            "voice_model": payload.voice_model,
+            "voice_model": voice_model,
         }
     except Exception as e:
         return JSONResponse(
@@ -1,8 +1,24 @@
-from fastapi import APIRouter, UploadFile, File
-from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import os
+import re
+from typing import Optional
 
-from models import SayIn
-from fish_audio import fish_tts_stream, fish_asr, FISH_MODE
+from fastapi import APIRouter, Header, Request
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.datastructures import UploadFile
+
+from models import SayIn, SayBatchIn
+from fish_audio import fish_asr, asr_executor, FISH_MODE
+from executors import ExecutorBusy
+from audio_preprocess import is_wav, preprocess_for_asr
+from tts_service import (
+    synthesize_stream, synthesize_stream_async, synthesize_pipelined_async, tts_key, admit_upstream, audio_url,
+    needs_upstream,
+)
+from tts_cache import tts_cache
+from admission import tts_admission, AdmissionRejected
+from voice_catalog import voice_catalog
 from database import get_account
 from personalities import get_personality, PERSONALITIES
 from models import UserPrefs
@@ -12,31 +28,73 @@ from config import settings
 router = APIRouter(prefix="/voice", tags=["voice"])
 
 
+def _resolve_reference_id(payload: SayIn):
+    reference_id = payload.reference_id
+    if not reference_id and payload.user_id:
+        account = get_account(payload.user_id)
+        if account and account.get("voice_model"):
+            reference_id = account["voice_model"]
+        else:
+            prefs = user_prefs.get(payload.user_id, UserPrefs())
+            personality = get_personality(prefs.personality_id)
+            reference_id = personality.voice_reference_id
+    return reference_id
+
+
+def _admission_rejected(e: AdmissionRejected, text: str) -> JSONResponse:
+    # Callers should show the line as text instead of waiting for audio
+    status = 429 if e.reason == "rate_limited" else 503
+    return JSONResponse(
+        {"error": "tts_unavailable", "reason": e.reason, "degrade": "text", "text": text},
+        status_code=status,
+        headers={"Retry-After": "2"},
+    )
+
+
 @router.post("/say", summary="Text-to-speech (streams mp3/wav)")
-def voice_say(payload: SayIn):
+async def voice_say(payload: SayIn, request: Request):
     try:
-        reference_id = payload.reference_id
-        if not reference_id and payload.user_id:
-            account = get_account(payload.user_id)
-            if account and account.get("voice_model"):
-                reference_id = account["voice_model"]
-            else:
-                prefs = user_prefs.get(payload.user_id, UserPrefs())
-                personality = get_personality(prefs.personality_id)
-                reference_id = personality.voice_reference_id
-        
-        gen = fish_tts_stream(
+        reference_id = await run_in_threadpool(_resolve_reference_id, payload)
+        pipelined = settings.FISH_TTS_PIPELINE if payload.pipelined is None else payload.pipelined
+        fmt = payload.format or "mp3"
+        speed = payload.speed or 1.0
+        volume = payload.volume or 0
+        latency = payload.latency or "balanced"
+        if not settings.FISH_ASYNC_TTS:
+            synthesize = synthesize_stream
+        elif pipelined:
+            synthesize = synthesize_pipelined_async
+        else:
+            synthesize = synthesize_stream_async
+
+        key = None if synthesize is synthesize_pipelined_async else tts_key(
+            payload.text, fmt, reference_id, speed, volume, latency
+        )
+        try:
+            held = await admit_upstream(payload.user_id, key, settings.TTS_ADMISSION_WAIT_SEC)
+        except AdmissionRejected as e:
+            return _admission_rejected(e, payload.text)
+
+        gen = synthesize(
             text=payload.text,
-            fmt=payload.format or "mp3",
+            fmt=fmt,
             reference_id=reference_id,
-            speed=payload.speed or 1.0,
-            volume=payload.volume or 0,
-            latency=payload.latency or "balanced",
+            speed=speed,
+            volume=volume,
+            latency=latency,
             temperature=payload.temperature or 0.7,
             top_p=payload.top_p or 0.7,
         )
-        media_type = "audio/mpeg" if (payload.format or "mp3") == "mp3" else "audio/wav"
-        return StreamingResponse(gen, media_type=media_type)
+        if held:
+            if synthesize is synthesize_stream:
+                gen = iterate_in_threadpool(gen)
+            gen = tts_admission.guard(gen)
+        media_type = "audio/mpeg" if fmt == "mp3" else "audio/wav"
+        headers = {}
+        if key is not None and settings.TTS_CACHE_ENABLED:
+            # Replayable from this URL once the stream has finished
+            headers = {"X-Audio-Id": key, "X-Audio-Url": audio_url(key, str(request.base_url))}
+        return StreamingResponse(gen, media_type=media_type, headers=headers)
     except Exception as e:
         print(f"[Voice Say Error] {e}")
         # Return a simple error response
@@ -46,18 +104,213 @@ def voice_say(payload: SayIn):
         )
 
 
-@router.post("/asr", summary="Speech-to-text (upload audio)")
-async def voice_asr(file: UploadFile = File(...), language: str = "en"):
-    audio_bytes = await file.read()
-    res = fish_asr(audio_bytes, language)
+async def _drain(stream) -> int:
+    size = 0
+    async for chunk in stream:
+        size += len(chunk)
+    return size
+
+
+@router.post("/say_batch", summary="Pre-synthesize several lines; returns a manifest of audio URLs")
+async def voice_say_batch(payload: SayBatchIn, request: Request):
+    """
+    Synthesize (or find cached) every line with bounded parallelism and return
+    {"items": [{"index", "text", "id", "url", "status", ...}]}; audio is then
+    fetched/replayed from GET /voice/audio/{id}. A batch that has to reach
+    Fish spends one of the user's admission tokens in total (a preload is one
+    request, however many lines it has); each uncached line then waits for a
+    global slot like any other synthesis. Lines that couldn't be admitted or
+    failed are reported per item, the rest of the batch still completes.
+    """
+    if not settings.TTS_CACHE_ENABLED:
+        return JSONResponse({"error": "tts_cache_disabled"}, status_code=400)
+    if len(payload.lines) > settings.TTS_BATCH_MAX_LINES:
+        return JSONResponse(
+            {"error": "too_many_lines", "max_lines": settings.TTS_BATCH_MAX_LINES}, status_code=413
+        )
+    reference_id = await run_in_threadpool(_resolve_reference_id, payload)
+    fmt = payload.format or "mp3"
+    opts = dict(
+        fmt=fmt,
+        reference_id=reference_id,
+        speed=payload.speed or 1.0,
+        volume=payload.volume or 0,
+        latency=payload.latency or "balanced",
+        temperature=payload.temperature or 0.7,
+        top_p=payload.top_p or 0.7,
+    )
+    key_opts = {k: opts[k] for k in ("fmt", "reference_id", "speed", "volume", "latency")}
+    sem = asyncio.Semaphore(settings.TTS_BATCH_CONCURRENCY)
+    tasks: dict = {}
+    user_charge: dict = {}
+
+    def charge_user() -> None:
+        # The first line that needs Fish spends the batch's one token; later lines share the outcome
+        if "reason" not in user_charge:
+            user_charge["reason"] = None
+            try:
+                tts_admission.charge(payload.user_id)
+            except AdmissionRejected as e:
+                user_charge["reason"] = e.reason
+        if user_charge["reason"] is not None:
+            raise AdmissionRejected(user_charge["reason"])
+
+    async def synth(text: str, key: str) -> dict:
+        async with sem:
+            # Cached, or another request is already synthesizing it: joining costs nothing
+            upstream = await run_in_threadpool(needs_upstream, key)
+            if upstream:
+                try:
+                    charge_user()
+                    await tts_admission.acquire(None, settings.TTS_ADMISSION_WAIT_SEC)
+                except AdmissionRejected as e:
+                    return {"status": "rejected", "reason": e.reason}
+            try:
+                if settings.FISH_ASYNC_TTS:
+                    size = await _drain(synthesize_stream_async(text=text, **opts))
+                else:
+                    size = await _drain(iterate_in_threadpool(synthesize_stream(text=text, **opts)))
+            except Exception as e:
+                print(f"[Voice Batch Error] {e}")
+                return {"status": "error", "error": str(e)}
+            finally:
+                if upstream:
+                    tts_admission.release()
+            return {"status": "synthesized" if upstream else "cached", "bytes": size}
+
+    keys = []
+    for text in payload.lines:
+        key = tts_key(text, **key_opts)
+        keys.append(key)
+        if key not in tasks:  # repeated lines are synthesized once
+            tasks[key] = asyncio.ensure_future(synth(text, key))
+    results = await asyncio.gather(*tasks.values())
+    by_key = dict(zip(tasks.keys(), results))
+
+    items = []
+    for i, (text, key) in enumerate(zip(payload.lines, keys)):
+        item = {"index": i, "text": text, "id": key, "format": fmt, **by_key[key]}
+        item["url"] = audio_url(key, str(request.base_url)) if item["status"] in ("cached", "synthesized") else None
+        items.append(item)
+    return {"items": items}
+
+
+AUDIO_ID = re.compile(r"^[0-9a-f]{64}$")
+AUDIO_MEDIA_TYPES = {"mp3": "audio/mpeg", "wav": "audio/wav", "opus": "audio/ogg", "pcm": "application/octet-stream"}
+
+
+@router.api_route("/audio/{audio_id}", methods=["GET", "HEAD"], summary="Replay a finished synthesis")
+async def voice_audio(audio_id: str, if_none_match: Optional[str] = Header(None)):
+    """
+    Serve a cached synthesis by its content address. The bytes behind an id
+    never change, so it's cacheable forever; Range/If-Range are handled by
+    FileResponse so players can seek and resume.
+    """
+    if not AUDIO_ID.match(audio_id):
+        return JSONResponse({"error": "not_found"}, status_code=404)
+    path = await run_in_threadpool(tts_cache.replay_path, audio_id)
+    try:
+        st = await run_in_threadpool(os.stat, path) if path else None
+    except OSError:
+        st = None  # evicted between lookup and stat
+    if st is None:
+        return JSONResponse({"error": "not_found"}, status_code=404)
+
+    etag = f'"{audio_id}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+    fmt = path.rsplit(".", 1)[-1]
+    return FileResponse(
+        path,
+        media_type=AUDIO_MEDIA_TYPES.get(fmt, "application/octet-stream"),
+        headers=headers,
+        stat_result=st,
+    )
+
+
+ASR_FORM_SLACK = 64 * 1024  # multipart framing and small fields on top of the audio itself
+ASR_UPLOAD_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    }
+}
+
+
+def _upload_size(spool) -> int:
+    spool.seek(0, os.SEEK_END)
+    size = spool.tell()
+    spool.seek(0)
+    return size
+
+
+def _transcribe(spool, language: str, pcm_sample_rate: Optional[int] = None, pcm_channels: int = 1):
+    with spool:
+        report = None
+        audio = spool
+        if settings.ASR_PREPROCESS:
+            head = spool.read(12)
+            spool.seek(0)
+            if pcm_sample_rate or is_wav(head):
+                audio, report = preprocess_for_asr(spool.read(), pcm_sample_rate, pcm_channels)
+        res = fish_asr(audio, language)
+        if report is not None:
+            res["preprocess"] = report
+        return res
+
+
+@router.post("/asr", summary="Speech-to-text (upload audio)", openapi_extra=ASR_UPLOAD_SCHEMA)
+async def voice_asr(
+    request: Request,
+    language: str = "en",
+    pcm_sample_rate: Optional[int] = None,  # set for headerless s16le PCM uploads
+    pcm_channels: int = 1,
+):
+    """
+    Multipart upload with a `file` part. The form is parsed here rather than
+    through File(...) so an oversized Content-Length is refused before the
+    body is read; the transcription then reads Starlette's own spooled file.
+    """
+    limit = settings.ASR_MAX_UPLOAD_MB * 1024 * 1024
+    too_large = JSONResponse({"error": "upload_too_large", "max_mb": settings.ASR_MAX_UPLOAD_MB}, status_code=413)
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit + ASR_FORM_SLACK:
+        return too_large
+    form = await request.form(max_files=1)
+    file = form.get("file")
+    if not isinstance(file, UploadFile):
+        await form.close()
+        return JSONResponse({"error": "file_required"}, status_code=422)
+    spool = file.file
+    if await run_in_threadpool(_upload_size, spool) > limit:  # chunked uploads carry no Content-Length
+        await form.close()
+        return too_large
+    try:
+        res = await asr_executor.run(
+            _transcribe, spool, language, pcm_sample_rate, pcm_channels,
+            timeout=settings.ASR_TIMEOUT_SEC,
+        )
+    except ExecutorBusy:
+        spool.close()
+        return JSONResponse({"error": "asr_busy"}, status_code=503, headers={"Retry-After": "2"})
+    except asyncio.TimeoutError:
+        return JSONResponse({"error": "asr_timeout"}, status_code=504)
     return JSONResponse(res)
 
 
 @router.get("/models", summary="List voice models (SDK only)")
-def list_models(self_only: bool = True):
+def list_models(self_only: bool = True, if_none_match: Optional[str] = Header(None)):
     if FISH_MODE != "sdk":
         return JSONResponse({"error": "SDK not available; cannot list models."}, status_code=400)
-    from fish_audio_sdk import Session
-    s = Session(settings.FISH_API_KEY)
-    models = s.list_models(self_only=self_only)
-    return {"items": [{"id": m.id, "title": m.title} for m in models.items]}
+    entry = voice_catalog.get(self_only)
+    max_age = max(0, int(voice_catalog.ttl_sec - entry.age))
+    headers = {
+        "ETag": entry.etag,
+        "Cache-Control": f"private, max-age={max_age}, stale-while-revalidate={int(voice_catalog.stale_sec)}",
+    }
+    if if_none_match and entry.etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"items": entry.items}, headers=headers)
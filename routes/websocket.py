@@ -1,16 +1,127 @@
+import asyncio
+import json
+from typing import Dict, List
+
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
+from config import settings
+from executors import ExecutorBusy
+from fish_audio import fish_asr, asr_executor
+from vad import EnergyVAD, float32_to_pcm16, pcm16_to_wav
 from websocket import ws_manager
 
 router = APIRouter(tags=["websocket"])
 
 
 @router.websocket("/ws/events/{user_id}")
-async def ws_events(ws: WebSocket, user_id: str):
-    await ws_manager.connect(user_id, ws)
+async def ws_events(ws: WebSocket, user_id: str, audio: bool = False):
+    """
+    Event stream for one user. Clients that connect with ?audio=1 (or send
+    {"type": "audio", "enabled": true}) get speak audio pushed down this socket
+    as binary frames; everyone else keeps the text-only protocol.
+    """
+    await ws_manager.connect(user_id, ws, audio=audio)
     try:
         while True:
             # If your frontend sends ACKs or other signals, receive them here.
-            await ws.receive_text()
+            raw = await ws.receive_text()
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                continue
+            if isinstance(msg, dict) and msg.get("type") == "audio":
+                ws_manager.set_audio(ws, bool(msg.get("enabled", True)))
     except WebSocketDisconnect:
         ws_manager.disconnect(user_id, ws)
+
+
+ASR_ENCODINGS = ("pcm16", "f32")
+ASR_SAMPLE_RATES = (8000, 96000)  # accepted sample_rate range (Hz)
+
+
+@router.websocket("/ws/asr/{user_id}")
+async def ws_asr(
+    ws: WebSocket,
+    user_id: str,
+    sample_rate: int = 16000,
+    encoding: str = "pcm16",
+    language: str = "en",
+):
+    """
+    Streaming speech-to-text. The client sends binary mono PCM frames
+    (encoding=pcm16 little-endian, or f32 straight from WebAudio); an energy
+    VAD closes a segment on silence and each segment is transcribed right away:
+      → {"type": "partial", "segment": i, "text": ...}
+    Text control messages: {"type": "flush"} closes the current segment,
+    {"type": "end"} also waits for all segments and replies
+      → {"type": "final", "text": <segments joined in order>}
+    Compressed (Opus/WebM) input isn't accepted: we ship no decoder.
+    """
+    await ws.accept()
+    if encoding not in ASR_ENCODINGS:
+        await ws.send_json({"type": "error", "error": "unsupported_encoding", "supported": list(ASR_ENCODINGS)})
+        await ws.close(code=1003)
+        return
+    lo, hi = ASR_SAMPLE_RATES
+    if not lo <= sample_rate <= hi:
+        await ws.send_json({"type": "error", "error": "unsupported_sample_rate", "min": lo, "max": hi})
+        await ws.close(code=1003)
+        return
+
+    vad = EnergyVAD(sample_rate=sample_rate)
+    transcripts: Dict[int, str] = {}
+    tasks: List[asyncio.Task] = []
+
+    async def transcribe(index: int, pcm: bytes):
+        try:
+            wav = pcm16_to_wav(pcm, sample_rate)
+            res = await asr_executor.run(fish_asr, wav, language, timeout=settings.ASR_TIMEOUT_SEC)
+        except ExecutorBusy:
+            await ws.send_json({"type": "error", "segment": index, "error": "asr_busy"})
+            return
+        except Exception as e:
+            await ws.send_json({"type": "error", "segment": index, "error": str(e)})
+            return
+        transcripts[index] = (res.get("text") or "").strip()
+        await ws.send_json({
+            "type": "partial",
+            "segment": index,
+            "text": transcripts[index],
+            "duration_ms": res.get("duration_ms"),
+        })
+
+    def submit(segments):
+        for pcm in segments:
+            if pcm:
+                tasks.append(asyncio.create_task(transcribe(len(tasks), pcm)))
+
+    try:
+        while True:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            if msg.get("bytes") is not None:
+                data = msg["bytes"]
+                if encoding == "f32":
+                    data = float32_to_pcm16(data[: len(data) - len(data) % 4])
+                submit(vad.feed(data))
+                continue
+            try:
+                control = json.loads(msg.get("text") or "")
+            except ValueError:
+                continue
+            kind = control.get("type") if isinstance(control, dict) else None
+            if kind in ("flush", "end"):
+                submit([vad.flush()])
+            if kind == "end":
+                await asyncio.gather(*tasks, return_exceptions=True)
+                text = " ".join(transcripts[i] for i in sorted(transcripts) if transcripts[i])
+                await ws.send_json({"type": "final", "text": text, "segments": len(tasks)})
+                transcripts.clear()
+                tasks.clear()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
@@ -0,0 +1,177 @@
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+
+# ===================== Shared chunk buffer =====================
+class _Flight:
+    """One in-progress upstream stream; late joiners replay from chunk 0."""
+
+    def __init__(self) -> None:
+        self.chunks: List[bytes] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.event: Optional[asyncio.Event] = None
+
+
+class _FlightCounters:
+    def __init__(self) -> None:
+        self.leaders = 0     # upstream streams actually started
+        self.followers = 0   # callers that attached instead (upstream calls avoided)
+
+    def snapshot(self, in_flight: int) -> dict:
+        return {
+            "in_flight": in_flight,
+            "upstream_calls": self.leaders,
+            "upstream_calls_avoided": self.followers,
+        }
+
+
+# ===================== asyncio =====================
+class AsyncStreamFlights(_FlightCounters):
+    """
+    Single-flight for async byte streams: the first caller for a key starts
+    `factory()` in a background task, concurrent callers with the same key
+    attach and receive the same chunks as they arrive. The upstream is
+    cancelled only when every subscriber has gone away.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._flights: Dict[str, _Flight] = {}
+
+    @staticmethod
+    def _notify(flight: _Flight) -> None:
+        if flight.event is not None:
+            flight.event.set()
+            flight.event = None
+
+    @staticmethod
+    async def _wait(flight: _Flight) -> None:
+        if flight.event is None:
+            flight.event = asyncio.Event()
+        await flight.event.wait()
+
+    async def _drive(self, key: str, flight: _Flight, factory: Callable[[], AsyncIterator[bytes]]) -> None:
+        try:
+            async for chunk in factory():
+                flight.chunks.append(chunk)
+                self._notify(flight)
+        except BaseException as e:
+            flight.error = e
+            if not isinstance(e, (Exception, asyncio.CancelledError)):
+                raise
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            self._notify(flight)
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[bytes]]) -> AsyncIterator[bytes]:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = _Flight()
+            self.leaders += 1
+            flight.task = asyncio.create_task(self._drive(key, flight, factory))
+        else:
+            self.followers += 1
+        flight.subscribers += 1
+        i = 0
+        try:
+            while True:
+                while i < len(flight.chunks):
+                    yield flight.chunks[i]
+                    i += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await self._wait(flight)
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task is not None:
+                # Nobody is listening any more: detach first so new callers start fresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._flights
+
+    def stats(self) -> dict:
+        return self.snapshot(len(self._flights))
+
+
+# ===================== threads =====================
+class SyncStreamFlights(_FlightCounters):
+    """Thread-based twin of AsyncStreamFlights for the sync TTS fallback path."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+
+    def _drive(self, key: str, flight: _Flight, factory: Callable[[], Iterator[bytes]]) -> None:
+        upstream = factory()
+        try:
+            for chunk in upstream:
+                with self._cond:
+                    flight.chunks.append(chunk)
+                    self._cond.notify_all()
+                    if flight.subscribers == 0:
+                        # Everyone left: detach so new callers start fresh
+                        flight.error = RuntimeError("abandoned")
+                        if self._flights.get(key) is flight:
+                            del self._flights[key]
+                        break
+        except Exception as e:
+            flight.error = e
+        finally:
+            upstream.close()
+            with self._cond:
+                flight.done = True
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                self._cond.notify_all()
+
+    def stream(self, key: str, factory: Callable[[], Iterator[bytes]]) -> Iterator[bytes]:
+        with self._cond:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                self.followers += 1
+            flight.subscribers += 1
+        if leader:
+            threading.Thread(target=self._drive, args=(key, flight, factory), daemon=True).start()
+        i = 0
+        try:
+            while True:
+                with self._cond:
+                    while i >= len(flight.chunks) and not flight.done:
+                        self._cond.wait()
+                    pending = flight.chunks[i:]
+                    done, error = flight.done, flight.error
+                for chunk in pending:
+                    yield chunk
+                i += len(pending)
+                if done and i >= len(flight.chunks):
+                    if error is not None:
+                        raise error
+                    return
+        finally:
+            with self._cond:
+                flight.subscribers -= 1
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._flights
+
+    def stats(self) -> dict:
+        with self._lock:
+            return self.snapshot(len(self._flights))
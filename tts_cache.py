@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import IO, AsyncIterable, AsyncIterator, Iterable, Iterator, Optional, Tuple
+
+import anyio
+
+from config import settings
+
+
+CHUNK_SIZE = 65536
+
+
+def cache_key(
+    text: str,
+    reference_id: Optional[str],
+    fmt: str,
+    speed: float,
+    volume: int,
+    latency: str,
+    model: Optional[str] = None,
+) -> str:
+    """Content address of one synthesis: same inputs -> same audio bytes."""
+    rid = reference_id or settings.FISH_VOICE_REFERENCE_ID
+    raw = json.dumps(
+        [text, rid, fmt, float(speed), int(volume), latency, model or settings.FISH_MODEL],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ===================== On-disk LRU =====================
+class TTSCache:
+    """
+    Content-addressed audio files under one directory, evicted LRU once the
+    total size passes max_bytes. The LRU order lives in memory and is rebuilt
+    from file mtimes on startup (hits touch the mtime).
+    """
+
+    def __init__(self, directory: str, max_bytes: int) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.replays = 0
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            entries = []
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.endswith(".tmp"):
+                    # Leftover from an interrupted write
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, name.split(".", 1)[0], path, st.st_size))
+            for _, key, path, size in sorted(entries):
+                self._index[key] = (path, size)
+                self._bytes += size
+            self._loaded = True
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        while self._bytes > self.max_bytes and self._index:
+            _, (path, size) = self._index.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def path_for(self, key: str) -> Optional[str]:
+        """Path of a cached entry without counting a hit/miss (used for replay URLs)."""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._index.get(key)
+        return entry[0] if entry else None
+
+    def replay_path(self, key: str) -> Optional[str]:
+        """Path of an entry being served by URL; counts as a use for LRU purposes."""
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            self._index.move_to_end(key)
+            self.replays += 1
+        return entry[0]
+
+    def open_entry(self, key: str) -> Optional[IO[bytes]]:
+        """
+        Open a cached entry for reading and mark it most recently used.
+        The open handle stays valid even if the entry is evicted meanwhile.
+        """
+        self._ensure_loaded()
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+        try:
+            f = open(entry[0], "rb")
+        except OSError:
+            with self._lock:
+                if self._index.get(key) == entry:
+                    self._index.pop(key, None)
+                    self._bytes -= entry[1]
+                self.misses += 1
+            return None
+        try:
+            os.utime(entry[0])
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return f
+
+    def write_through(self, key: str, fmt: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Yield chunks to the caller while spooling them to disk; the entry only
+        becomes visible once the upstream stream finished cleanly.
+        """
+        self._ensure_loaded()
+        final_path = os.path.join(self.directory, f"{key}.{fmt}")
+        tmp_path = f"{final_path}.{uuid.uuid4().hex}.tmp"
+        size = 0
+        f = open(tmp_path, "wb")
+        try:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+                yield chunk
+            f.close()
+        except BaseException:
+            f.close()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._commit(key, tmp_path, final_path, size)
+
+    async def write_through_async(self, key: str, fmt: str, chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        """Async twin of write_through; file writes go through anyio's worker threads."""
+        await anyio.to_thread.run_sync(self._ensure_loaded)
+        final_path = os.path.join(self.directory, f"{key}.{fmt}")
+        tmp_path = f"{final_path}.{uuid.uuid4().hex}.tmp"
+        size = 0
+        f = await anyio.open_file(tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                await f.write(chunk)
+                size += len(chunk)
+                yield chunk
+            await f.aclose()
+        except BaseException:
+            with anyio.CancelScope(shield=True):
+                await f.aclose()
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        await anyio.to_thread.run_sync(self._commit, key, tmp_path, final_path, size)
+
+    def _commit(self, key: str, tmp_path: str, final_path: str, size: int) -> None:
+        if size == 0 or size > self.max_bytes:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        os.replace(tmp_path, final_path)
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._index[key] = (final_path, size)
+            self._bytes += size
+            self.writes += 1
+            self._evict_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._index)
+            size = self._bytes
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.TTS_CACHE_ENABLED,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "replays": self.replays,
+        }
+
+
+def iter_file(f: IO[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    with f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def iter_file_async(f: IO[bytes], chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    af = anyio.wrap_file(f)
+    async with af:
+        while True:
+            chunk = await af.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+tts_cache = TTSCache(settings.TTS_CACHE_DIR, settings.TTS_CACHE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,171 @@
+from typing import Optional
+
+import anyio
+
+from config import settings
+from fish_audio import fish_tts_stream, fish_tts_stream_async, fish_tts_stream_pipelined
+from tts_cache import tts_cache, cache_key, iter_file, iter_file_async
+from singleflight import AsyncStreamFlights, SyncStreamFlights
+from admission import tts_admission
+
+
+# Identical concurrent syntheses (same cache key) share one upstream stream
+async_flights = AsyncStreamFlights()
+sync_flights = SyncStreamFlights()
+
+
+def singleflight_stats() -> dict:
+    a, s = async_flights.stats(), sync_flights.stats()
+    return {k: a[k] + s[k] for k in a}
+
+
+# ===================== Cached synthesis =====================
+def _tts_key(text, fmt, reference_id, speed, volume, latency) -> str:
+    return cache_key(text, reference_id, fmt, speed, volume, latency)
+
+
+def tts_key(text: str, fmt: str = "mp3", reference_id: Optional[str] = None,
+            speed: float = 1.0, volume: int = 0, latency: str = "balanced") -> str:
+    return _tts_key(text, fmt, reference_id, speed, volume, latency)
+
+
+def audio_url(key: str, base_url: Optional[str] = None) -> str:
+    """
+    Stable replay URL of a finished synthesis (see GET /voice/audio/{id}):
+    absolute under PUBLIC_BASE_URL (or base_url), otherwise relative to the API base.
+    """
+    base = (settings.PUBLIC_BASE_URL or base_url or "").rstrip("/")
+    return f"{base}/voice/audio/{key}"
+
+
+def cached_audio_url(key: str) -> Optional[str]:
+    if settings.TTS_CACHE_ENABLED and tts_cache.path_for(key) is not None:
+        return audio_url(key)
+    return None
+
+
+def needs_upstream(key: str) -> bool:
+    """False when the line is cached or an identical synthesis is already streaming."""
+    if settings.TTS_CACHE_ENABLED and tts_cache.path_for(key) is not None:
+        return False
+    return not (async_flights.in_flight(key) or sync_flights.in_flight(key))
+
+
+async def admit_upstream(user_id: Optional[str], key: Optional[str], timeout: float) -> bool:
+    """
+    Take a TTS admission slot unless the request won't reach Fish. key=None
+    means a pipelined request: only the user's token is spent here, each
+    segment takes its own slot (see synthesize_pipelined_async). Returns
+    whether a slot is now held; raises AdmissionRejected when it couldn't be
+    granted within `timeout`.
+    """
+    if key is None:
+        tts_admission.charge(user_id)
+        return False
+    if not await anyio.to_thread.run_sync(needs_upstream, key):
+        return False
+    await tts_admission.acquire(user_id, timeout)
+    return True
+
+
+def synthesize_stream(
+    text: str,
+    fmt: str = "mp3",
+    reference_id: Optional[str] = None,
+    speed: float = 1.0,
+    volume: int = 0,
+    latency: str = "balanced",
+    temperature: float = 0.7,
+    top_p: float = 0.7,
+):
+    """
+    Front door for TTS: replay from the on-disk cache when we've synthesized
+    this exact line before; otherwise join an identical in-flight synthesis,
+    or start one that streams from Fish and spools to the cache.
+    """
+    key = _tts_key(text, fmt, reference_id, speed, volume, latency)
+    if settings.TTS_CACHE_ENABLED:
+        cached = tts_cache.open_entry(key)
+        if cached is not None:
+            yield from iter_file(cached)
+            return
+
+    def upstream():
+        gen = fish_tts_stream(
+            text=text,
+            fmt=fmt,
+            reference_id=reference_id,
+            speed=speed,
+            volume=volume,
+            latency=latency,
+            temperature=temperature,
+            top_p=top_p,
+        )
+        if settings.TTS_CACHE_ENABLED:
+            return tts_cache.write_through(key, fmt, gen)
+        return gen
+
+    yield from sync_flights.stream(key, upstream)
+
+
+async def synthesize_stream_async(
+    text: str,
+    fmt: str = "mp3",
+    reference_id: Optional[str] = None,
+    speed: float = 1.0,
+    volume: int = 0,
+    latency: str = "balanced",
+    temperature: float = 0.7,
+    top_p: float = 0.7,
+):
+    """Async twin of synthesize_stream; holds no threadpool worker while streaming."""
+    key = _tts_key(text, fmt, reference_id, speed, volume, latency)
+    if settings.TTS_CACHE_ENABLED:
+        cached = await anyio.to_thread.run_sync(tts_cache.open_entry, key)
+        if cached is not None:
+            async for chunk in iter_file_async(cached):
+                yield chunk
+            return
+
+    def upstream():
+        gen = fish_tts_stream_async(
+            text=text,
+            fmt=fmt,
+            reference_id=reference_id,
+            speed=speed,
+            volume=volume,
+            latency=latency,
+            temperature=temperature,
+            top_p=top_p,
+        )
+        if settings.TTS_CACHE_ENABLED:
+            return tts_cache.write_through_async(key, fmt, gen)
+        return gen
+
+    async for chunk in async_flights.stream(key, upstream):
+        yield chunk
+
+
+def synthesize_pipelined_async(text: str, fmt: str = "mp3", admit_timeout: Optional[float] = None, **opts):
+    """
+    Sentence-pipelined synthesis; each segment goes through the cache on its
+    own and takes a global admission slot while it is synthesized, so the
+    lookahead can't push upstream concurrency past TTS_MAX_CONCURRENT. The
+    caller has already charged the user (admit_upstream with key=None).
+    """
+    timeout = settings.TTS_ADMISSION_WAIT_SEC if admit_timeout is None else admit_timeout
+
+    async def segment_stream(text: str, fmt: str = "mp3", reference_id: Optional[str] = None,
+                             speed: float = 1.0, volume: int = 0, latency: str = "balanced", **rest):
+        key = _tts_key(text, fmt, reference_id, speed, volume, latency)
+        held = await admit_upstream(None, key, timeout)
+        try:
+            async for chunk in synthesize_stream_async(
+                text=text, fmt=fmt, reference_id=reference_id, speed=speed, volume=volume, latency=latency, **rest
+            ):
+                yield chunk
+        finally:
+            if held:
+                tts_admission.release()
+
+    return fish_tts_stream_pipelined(text=text, fmt=fmt, segment_stream=segment_stream, **opts)
@@ -0,0 +1,132 @@
+import io
+import wave
+from collections import deque
+from typing import List, Optional
+
+import numpy as np
+
+from config import settings
+
+
+# ===================== Energy helpers =====================
+def frame_energy_db(samples: np.ndarray, frame_len: int) -> np.ndarray:
+    """Per-frame RMS level in dBFS for int16 samples (trailing partial frame dropped)."""
+    n = len(samples) // frame_len
+    if n == 0:
+        return np.empty(0, dtype=np.float32)
+    frames = samples[: n * frame_len].reshape(n, frame_len).astype(np.float32) / 32768.0
+    power = np.mean(frames * frames, axis=1)
+    return 10.0 * np.log10(power + 1e-12)
+
+
+def float32_to_pcm16(data: bytes) -> bytes:
+    """WebAudio-style float32 [-1, 1] samples → little-endian int16 PCM."""
+    samples = np.frombuffer(data, dtype="<f4")
+    return (np.clip(samples, -1.0, 1.0) * 32767.0).astype("<i2").tobytes()
+
+
+def pcm16_to_wav(pcm: bytes, sample_rate: int, channels: int = 1) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+
+# ===================== Streaming VAD =====================
+class EnergyVAD:
+    """
+    Lightweight energy-based voice activity detector for streamed mono int16 PCM.
+    Frame levels are computed with NumPy per feed() call; a frame counts as
+    speech when it is above both an absolute floor and the tracked noise floor
+    plus a margin. A segment closes after `silence_ms` of non-speech (or at
+    `max_segment_ms`) and is returned as raw PCM, with a short pre-roll so
+    word onsets aren't clipped.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        silence_ms: Optional[int] = None,
+        min_speech_ms: Optional[int] = None,
+        max_segment_ms: Optional[int] = None,
+        threshold_dbfs: Optional[float] = None,
+        noise_margin_db: Optional[float] = None,
+        pre_roll_ms: int = 200,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.frame_len = max(1, sample_rate * frame_ms // 1000)
+        self.frame_ms = frame_ms
+        self.silence_frames = (silence_ms or settings.ASR_STREAM_SILENCE_MS) // frame_ms
+        self.min_speech_frames = (min_speech_ms or settings.ASR_STREAM_MIN_SPEECH_MS) // frame_ms
+        self.max_frames = (max_segment_ms or settings.ASR_STREAM_MAX_SEGMENT_MS) // frame_ms
+        self.threshold_dbfs = settings.VAD_THRESHOLD_DBFS if threshold_dbfs is None else threshold_dbfs
+        self.noise_margin_db = settings.VAD_NOISE_MARGIN_DB if noise_margin_db is None else noise_margin_db
+        self.noise_floor_db = self.threshold_dbfs - self.noise_margin_db
+        self._pending = b""
+        self._pre_roll: "deque[bytes]" = deque(maxlen=max(1, pre_roll_ms // frame_ms))
+        self._segment: List[bytes] = []
+        self._speech_frames = 0
+        self._silence_run = 0
+
+    @property
+    def in_speech(self) -> bool:
+        return bool(self._segment)
+
+    def _close(self) -> Optional[bytes]:
+        segment, speech = self._segment, self._speech_frames
+        self._segment, self._speech_frames, self._silence_run = [], 0, 0
+        if speech < self.min_speech_frames:
+            return None
+        return b"".join(segment)
+
+    def feed(self, pcm: bytes) -> List[bytes]:
+        """Add PCM bytes; returns any segments that closed."""
+        data = self._pending + pcm
+        frame_bytes = self.frame_len * 2
+        usable = len(data) - len(data) % frame_bytes
+        self._pending = data[usable:]
+        if not usable:
+            return []
+
+        samples = np.frombuffer(data[:usable], dtype="<i2")
+        levels = frame_energy_db(samples, self.frame_len)
+        closed: List[bytes] = []
+        for i, level in enumerate(levels.tolist()):
+            frame = data[i * frame_bytes:(i + 1) * frame_bytes]
+            threshold = max(self.threshold_dbfs, self.noise_floor_db + self.noise_margin_db)
+            is_speech = level > threshold
+            if not is_speech:
+                # Slow EMA of the background level, only from non-speech frames
+                self.noise_floor_db += 0.05 * (level - self.noise_floor_db)
+
+            if self._segment:
+                self._segment.append(frame)
+                if is_speech:
+                    self._speech_frames += 1
+                    self._silence_run = 0
+                else:
+                    self._silence_run += 1
+                if self._silence_run >= self.silence_frames or len(self._segment) >= self.max_frames:
+                    seg = self._close()
+                    if seg:
+                        closed.append(seg)
+            elif is_speech:
+                self._segment = list(self._pre_roll) + [frame]
+                self._speech_frames = 1
+                self._silence_run = 0
+                self._pre_roll.clear()
+            else:
+                self._pre_roll.append(frame)
+        return closed
+
+    def flush(self) -> Optional[bytes]:
+        """Close whatever is in progress (end of utterance signalled by the client)."""
+        if self._segment and self._pending:
+            self._segment.append(self._pending)
+        self._pending = b""
+        self._pre_roll.clear()
+        return self._close() if self._segment else None
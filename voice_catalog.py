@@ -0,0 +1,137 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from config import settings
+from fish_client import get_sdk_session
+from personalities import PERSONALITIES
+
+
+FISH_MODEL_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class CatalogEntry:
+    def __init__(self, items: List[dict]) -> None:
+        self.items = items
+        self.fetched_at = time.monotonic()
+        body = json.dumps(items, sort_keys=True, separators=(",", ":"))
+        self.etag = '"' + hashlib.sha256(body.encode("utf-8")).hexdigest()[:32] + '"'
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
+# ===================== Voice model catalogue =====================
+class VoiceCatalog:
+    """
+    TTL cache of Fish `list_models`, per self_only flag, with
+    stale-while-revalidate: within TTL entries are served as-is; up to
+    TTL + stale window the stale entry is served while one background thread
+    refreshes it; beyond that the caller fetches synchronously, and still gets
+    the old entry if that fetch fails.
+    """
+
+    def __init__(self, ttl_sec: float, stale_sec: float) -> None:
+        self.ttl_sec = ttl_sec
+        self.stale_sec = stale_sec
+        self._entries: Dict[bool, CatalogEntry] = {}
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[bool, threading.Lock] = {True: threading.Lock(), False: threading.Lock()}
+        self._refreshing: Set[bool] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.fetches = 0
+        self.refresh_errors = 0
+
+    def _fetch(self, self_only: bool) -> CatalogEntry:
+        models = get_sdk_session().list_models(self_only=self_only)
+        entry = CatalogEntry([{"id": m.id, "title": m.title} for m in models.items])
+        with self._lock:
+            self._entries[self_only] = entry
+            self.fetches += 1
+        return entry
+
+    def _refresh_in_background(self, self_only: bool) -> None:
+        with self._lock:
+            if self_only in self._refreshing:
+                return
+            self._refreshing.add(self_only)
+
+        def run():
+            try:
+                with self._fetch_locks[self_only]:
+                    self._fetch(self_only)
+            except Exception as e:
+                self.refresh_errors += 1
+                print(f"[Voice catalog] background refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(self_only)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, self_only: bool = True) -> CatalogEntry:
+        entry = self._entries.get(self_only)
+        if entry is not None and entry.age < self.ttl_sec:
+            self.hits += 1
+            return entry
+        if entry is not None and entry.age < self.ttl_sec + self.stale_sec:
+            self.stale_hits += 1
+            self._refresh_in_background(self_only)
+            return entry
+        # Missing or too old: fetch now, one caller at a time per key
+        with self._fetch_locks[self_only]:
+            entry = self._entries.get(self_only)
+            if entry is not None and entry.age < self.ttl_sec:
+                return entry
+            try:
+                return self._fetch(self_only)
+            except Exception as e:
+                if entry is None:
+                    raise
+                self.refresh_errors += 1
+                self.stale_hits += 1
+                print(f"[Voice catalog] refresh failed, serving stale list: {e}")
+                return entry
+
+    def known_ids(self) -> Set[str]:
+        """Every voice id we know about without a network hop."""
+        ids = {p.voice_reference_id for p in PERSONALITIES.values() if p.voice_reference_id}
+        if settings.FISH_VOICE_REFERENCE_ID:
+            ids.add(settings.FISH_VOICE_REFERENCE_ID)
+        for entry in list(self._entries.values()):
+            ids.update(item["id"] for item in entry.items)
+        return ids
+
+    def stats(self) -> dict:
+        return {
+            "entries": {("self" if k else "public"): {"count": len(e.items), "age_sec": round(e.age, 1)}
+                        for k, e in list(self._entries.items())},
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "fetches": self.fetches,
+            "refresh_errors": self.refresh_errors,
+        }
+
+
+voice_catalog = VoiceCatalog(settings.VOICE_MODELS_TTL_SEC, settings.VOICE_MODELS_STALE_SEC)
+
+
+def validate_voice_model(voice_model: str) -> Optional[str]:
+    """
+    Cheap local check of a voice model id; returns an error code or None.
+    Ids in the cached catalogue always pass. Unknown ids must at least look
+    like a Fish model id, and are rejected outright in strict mode (public
+    voices the client picked won't be in our cached catalogue otherwise).
+    """
+    if voice_model in voice_catalog.known_ids():
+        return None
+    if not FISH_MODEL_ID.match(voice_model):
+        return "invalid_voice_model"
+    if settings.VOICE_MODEL_STRICT:
+        return "unknown_voice_model"
+    return None
@@ -1,13 +1,26 @@
 import asyncio
+import functools
+import heapq
+import time
+import uuid
+import zlib
 from datetime import datetime, timedelta, timezone
-from typing import Dict, Set, Optional
+from typing import Dict, List, Set, Optional, Tuple
 from fastapi import WebSocket, WebSocketDisconnect
 
 from models import Event, EventType, PomodoroPhase, UserPrefs
 from personalities import get_personality, apply_personality_text, personality_style_prompt
-from letta_integration import letta_generate_single, generate_fallback_response, create_letta_agent
-from database import get_account, update_account_agent_id
+from letta_integration import generate_fallback_response, aletta_generate_single
+from database import get_account
+from agent_pool import agent_pool
+from line_pool import line_pool, reminder_prompt, reminder_situation
 from shared_state import user_prefs
+from config import settings
+from metrics import LatencyWindow
+from tts_service import (
+    synthesize_stream_async, synthesize_pipelined_async, tts_key, admit_upstream, cached_audio_url,
+)
+from admission import tts_admission, AdmissionRejected
 
 
 # ===================== Events & WebSocket =====================
@@ -15,22 +28,41 @@ event_queue: "asyncio.Queue[Event]" = asyncio.Queue()
 
 
 class WSManager:
+    """
+    Per-user rooms of event sockets. Sockets that opted into audio push
+    (see routes/websocket.py) also receive binary audio frames.
+    """
+
     def __init__(self) -> None:
         self._rooms: Dict[str, Set[WebSocket]] = {}
+        self._audio: Set[WebSocket] = set()
 
-    async def connect(self, user_id: str, ws: WebSocket):
+    async def connect(self, user_id: str, ws: WebSocket, audio: bool = False):
         await ws.accept()
         self._rooms.setdefault(user_id, set()).add(ws)
+        self.set_audio(ws, audio)
 
     def disconnect(self, user_id: str, ws: WebSocket):
+        self._audio.discard(ws)
         if user_id in self._rooms and ws in self._rooms[user_id]:
             self._rooms[user_id].remove(ws)
             if not self._rooms[user_id]:
                 del self._rooms[user_id]
 
-    async def send_json(self, user_id: str, message: dict):
+    def set_audio(self, ws: WebSocket, enabled: bool):
+        if enabled:
+            self._audio.add(ws)
+        else:
+            self._audio.discard(ws)
+
+    def wants_audio(self, user_id: str) -> bool:
+        return any(ws in self._audio for ws in self._rooms.get(user_id, ()))
+
+    async def send_json(self, user_id: str, message: dict, audio_only: bool = False):
         conns = self._rooms.get(user_id, set())
         for ws in list(conns):
+            if audio_only and ws not in self._audio:
+                continue
             try:
                 await ws.send_json(message)
             except WebSocketDisconnect:
@@ -38,6 +70,18 @@ class WSManager:
             except Exception:
                 self.disconnect(user_id, ws)
 
+    async def send_audio(self, user_id: str, frame: bytes):
+        conns = self._rooms.get(user_id, set())
+        for ws in list(conns):
+            if ws not in self._audio:
+                continue
+            try:
+                await ws.send_bytes(frame)
+            except WebSocketDisconnect:
+                self.disconnect(user_id, ws)
+            except Exception:
+                self.disconnect(user_id, ws)
+
 
 ws_manager = WSManager()
 
@@ -56,7 +100,7 @@ def cancel_followup(user_id: str):
 
 
 def ensure_user_has_agent(user_id: str) -> Optional[str]:
-    """Ensure user has a Letta agent, create one if needed."""
+    """Ensure user has a Letta agent, claiming one from the warm pool if needed."""
     account = get_account(user_id)
     if not account:
         return None
@@ -65,20 +109,23 @@ def ensure_user_has_agent(user_id: str) -> Optional[str]:
     if agent_id:
         return agent_id
     
-    # User doesn't have an agent, try to create one
-    print(f"[DEBUG] User {user_id} has no agent, attempting to create one")
-    new_agent_id = create_letta_agent(user_id)
+    # User doesn't have an agent: claim a pre-created one (never create inline)
+    print(f"[DEBUG] User {user_id} has no agent, claiming one from the pool")
+    new_agent_id = agent_pool.claim(user_id)
     
     if new_agent_id:
-        # Update the account with the new agent ID
-        update_account_agent_id(user_id, new_agent_id)
-        print(f"[DEBUG] Updated account {user_id} with agent ID {new_agent_id}")
+        print(f"[DEBUG] Bound pooled agent {new_agent_id} to {user_id}")
         return new_agent_id
     else:
-        print(f"[DEBUG] Failed to create agent for {user_id}")
+        print(f"[DEBUG] Agent pool empty; {user_id} will get the next agent created")
         return None
 
 
+async def aensure_user_has_agent(user_id: str) -> Optional[str]:
+    """ensure_user_has_agent off the event loop (it only touches SQLite now)."""
+    return await asyncio.to_thread(ensure_user_has_agent, user_id)
+
+
 def fallback_text_for(event: Event, personality) -> str:
     if event.type == EventType.REMINDER_DUE:
         phase = event.data.get("phase")
@@ -98,42 +145,59 @@ def fallback_text_for(event: Event, personality) -> str:
     return apply_personality_text(personality, base)
 
 
-async def generate_text_for_event(event: Event) -> str:
+# ===================== Latency budget for event copy =====================
+class DeadlineStats:
+    def __init__(self) -> None:
+        self.counts: Dict[str, Dict[str, int]] = {}
+
+    def add(self, event_type: EventType, outcome: str) -> None:
+        c = self.counts.setdefault(event_type.value, {"hit": 0, "miss": 0, "late_delivered": 0, "late_dropped": 0})
+        c[outcome] += 1
+
+    def snapshot(self) -> dict:
+        out = {}
+        for event_type, c in self.counts.items():
+            total = c["hit"] + c["miss"]
+            out[event_type] = {
+                **c,
+                "deadline_sec": event_deadline(EventType(event_type)),
+                "hit_rate": round(c["hit"] / total, 3) if total else None,
+            }
+        return {"grace_sec": settings.LETTA_LATE_GRACE_SEC, "by_event": out}
+
+
+deadline_stats = DeadlineStats()
+
+
+def event_deadline(event_type: EventType) -> float:
+    if event_type == EventType.MSG_FOLLOWUP:
+        return settings.LETTA_DEADLINE_FOLLOWUP_SEC
+    return settings.LETTA_DEADLINE_REMINDER_SEC
+
+
+async def generate_text_for_event(event: Event) -> Tuple[str, Optional["asyncio.Future[str]"]]:
+    """
+    Copy for an event within its latency budget. Returns (text, late): when
+    Letta misses the deadline, text is the fallback line and `late` resolves
+    to the real reply ("" if it never came within the grace window).
+    """
     prefs = user_prefs.get(event.user_id, UserPrefs())
     personality = get_personality(prefs.personality_id)
 
+    if event.type == EventType.REMINDER_DUE:
+        # Phase lines aren't personal: serve a pre-generated one when we have it
+        line = line_pool.take(personality, event.data.get("phase", ""), event.data.get("minutes"))
+        if line:
+            return line, None
+
     # Ensure user has an agent (create if needed)
-    agent_id = ensure_user_has_agent(event.user_id)
-    account = get_account(event.user_id)
+    agent_id = await aensure_user_has_agent(event.user_id)
 
     if not agent_id:
-        return fallback_text_for(event, personality)
+        return fallback_text_for(event, personality), None
 
     if event.type == EventType.REMINDER_DUE:
-        phase = event.data.get("phase", "")
-        minutes = event.data.get("minutes")
-        base = personality_style_prompt(
-            personality,
-            (
-                "You are a supportive, ADHD‑friendly companion coach. "
-                "Respond in ONE short, conversational English sentence (max ~20 words), friendly and positive."
-            ),
-        )
-        if phase == PomodoroPhase.FOCUS_START:
-            prompt = (
-                f"{base} We're starting a {minutes}-minute focus block; give a kickoff encouragement, "
-                "and mention you'll gently check in later if they don't reply."
-            )
-        elif phase == PomodoroPhase.BREAK_START:
-            prompt = (
-                f"{base} Focus just ended; starting a {minutes}-minute break—offer a quick relaxation tip."
-            )
-        elif phase == PomodoroPhase.CYCLE_END:
-            prompt = (
-                f"{base} This round is complete; give praise and ask if they want to continue."
-            )
-        else:
-            prompt = f"{base} All pomodoros are done today; celebrate and offer a short wrap‑up tip."
+        prompt = reminder_prompt(personality, event.data.get("phase", ""), event.data.get("minutes"))
     elif event.type == EventType.MSG_FOLLOWUP:
         base = personality_style_prompt(
             personality,
@@ -142,60 +206,374 @@ async def generate_text_for_event(event: Event) -> str:
                 "lightly check on progress and suggest a tiny next step. Be empathetic and non‑pressuring."
             ),
         )
-        prompt = f"{base} The user has not replied for a while."
+        prompt = f"{base} {FOLLOWUP_SITUATION}"
     else:
-        return fallback_text_for(event, personality)
+        return fallback_text_for(event, personality), None
 
-    text = letta_generate_single(prompt, personality=personality, agent_id=agent_id).strip()
-    return text or fallback_text_for(event, personality)
+    return await _generate_within_deadline(
+        event.type, event_deadline(event.type), prompt, personality, agent_id, fallback_text_for(event, personality)
+    )
 
 
-async def voice_orchestrator():
+async def _generate_within_deadline(event_type: EventType, deadline: float, prompt: str, personality,
+                                    agent_id: str, fallback: str) -> Tuple[str, Optional["asyncio.Future[str]"]]:
+    reply = asyncio.ensure_future(aletta_generate_single(
+        prompt, personality=personality, agent_id=agent_id, timeout=deadline + settings.LETTA_LATE_GRACE_SEC,
+    ))
+    done, _ = await asyncio.wait({reply}, timeout=deadline)
+    if reply not in done:
+        deadline_stats.add(event_type, "miss")
+        return fallback, reply
+    deadline_stats.add(event_type, "hit")
+    text = reply.result().strip()
+    return text or fallback, None
+
+
+FOLLOWUP_SITUATION = "The user has not replied for a while."
+
+
+def event_situation(event: Event) -> str:
+    if event.type == EventType.REMINDER_DUE:
+        return reminder_situation(event.data.get("phase", ""), event.data.get("minutes"))
+    return FOLLOWUP_SITUATION + " Lightly check on progress and suggest a tiny next step."
+
+
+async def generate_text_for_events(events: List[Event]) -> Tuple[str, Optional["asyncio.Future[str]"]]:
     """
-    Consume events → generate one line of copy → dispatch via WS:
-      - type='speak': client may fetch /voice/say and play audio (if voice is enabled)
-      - type='chat' : text only
+    One line for a burst of a user's events (see ORCH_COALESCE_MS): a single
+    prompt describing them in order, under the tightest of their deadlines.
+    The fallback is the latest event's line, since that's the current state.
     """
+    if len(events) == 1:
+        return await generate_text_for_event(events[0])
+    latest = events[-1]
+    prefs = user_prefs.get(latest.user_id, UserPrefs())
+    personality = get_personality(prefs.personality_id)
+    fallback = fallback_text_for(latest, personality)
+
+    agent_id = await aensure_user_has_agent(latest.user_id)
+    if not agent_id:
+        return fallback, None
+
+    base = personality_style_prompt(
+        personality,
+        (
+            "You are a supportive, ADHD‑friendly companion coach. Several things just happened back to back; "
+            "respond in ONE short, conversational English message (max ~30 words) that covers them together."
+        ),
+    )
+    steps = " ".join(f"({i}) {event_situation(e)}" for i, e in enumerate(events, 1))
+    prompt = f"{base} In order: {steps}"
+    deadline = min(event_deadline(e.type) for e in events)
+    return await _generate_within_deadline(latest.type, deadline, prompt, personality, agent_id, fallback)
+
+
+_late_tasks: Set[asyncio.Task] = set()
+
+
+async def _deliver_late_reply(event: Event, message: dict, late: "asyncio.Future[str]"):
+    """Replace an already-sent fallback line with Letta's reply if it arrives in the grace window."""
+    try:
+        text = (await late).strip()
+    except Exception as e:
+        print(f"[Orchestrator] late reply failed for {event.user_id}: {e}")
+        text = ""
+    if not text:
+        deadline_stats.add(event.type, "late_dropped")
+        return
+    deadline_stats.add(event.type, "late_delivered")
+    await ws_manager.send_json(event.user_id, {
+        "type": "update",
+        "message_id": message["message_id"],  # the message whose text this replaces
+        "event": event.type.value,
+        "text": text,
+        "voice_reference_id": message.get("voice_reference_id"),
+    })
+
+
+def start_late_delivery(event: Event, message: dict, late: "asyncio.Future[str]"):
+    task = asyncio.create_task(_deliver_late_reply(event, message, late))
+    _late_tasks.add(task)
+    task.add_done_callback(_late_tasks.discard)
+
+
+# ===================== Audio push over the event socket =====================
+WS_AUDIO_FORMAT = "mp3"
+_audio_tasks: Set[asyncio.Task] = set()
+
+
+async def push_speech_audio(user_id: str, message_id: str, text: str, reference_id: Optional[str],
+                            held: bool = False):
+    """
+    Stream synthesized audio to the user's audio-enabled sockets:
+      {"type": "audio_start", "message_id", "format"} → binary frames → {"type": "audio_end", ...}
+    Each binary frame is the 16 raw bytes of the message id (uuid) followed by audio bytes.
+    On failure an "audio_error" is sent and the client can fall back to /voice/say.
+    `held` means the caller took a TTS admission slot for us; it is released here.
+    """
+    try:
+        await _push_speech_audio(user_id, message_id, text, reference_id)
+    finally:
+        if held:
+            tts_admission.release()
+
+
+async def _push_speech_audio(user_id: str, message_id: str, text: str, reference_id: Optional[str]):
+    tag = uuid.UUID(hex=message_id).bytes
+    if settings.FISH_TTS_PIPELINE:
+        synthesize = functools.partial(synthesize_pipelined_async, admit_timeout=settings.TTS_ADMISSION_EVENT_WAIT_SEC)
+    else:
+        synthesize = synthesize_stream_async
+    await ws_manager.send_json(user_id, {
+        "type": "audio_start", "message_id": message_id, "format": WS_AUDIO_FORMAT,
+    }, audio_only=True)
+    size = 0
+    try:
+        async for chunk in synthesize(text=text, fmt=WS_AUDIO_FORMAT, reference_id=reference_id):
+            if not ws_manager.wants_audio(user_id):
+                return  # every audio socket went away
+            size += len(chunk)
+            await ws_manager.send_audio(user_id, tag + chunk)
+    except Exception as e:
+        print(f"[WS audio] synthesis failed for {user_id}: {e}")
+        await ws_manager.send_json(user_id, {
+            "type": "audio_error", "message_id": message_id, "error": str(e),
+        }, audio_only=True)
+        return
+    end = {"type": "audio_end", "message_id": message_id, "bytes": size}
+    if not settings.FISH_TTS_PIPELINE:
+        url = await asyncio.to_thread(cached_audio_url, tts_key(text, WS_AUDIO_FORMAT, reference_id))
+        if url:
+            end["audio_url"] = url  # replay without re-synthesizing
+    await ws_manager.send_json(user_id, end, audio_only=True)
+
+
+def start_speech_audio(user_id: str, message_id: str, text: str, reference_id: Optional[str],
+                       held: bool = False):
+    task = asyncio.create_task(push_speech_audio(user_id, message_id, text, reference_id, held))
+    _audio_tasks.add(task)
+    task.add_done_callback(_audio_tasks.discard)
+
+
+async def admit_event_speech(user_id: str, text: str, reference_id: Optional[str], push: bool):
+    """
+    TTS admission for an event line. Pushed audio takes a real slot (held until
+    the push finishes); otherwise we only check that the client's /voice/say
+    would likely get in. Returns (admitted, slot_held, reject_reason).
+    """
+    if not push:
+        if tts_admission.would_admit(user_id):
+            return True, False, None
+        return False, False, "busy"
+    key = None if settings.FISH_TTS_PIPELINE else tts_key(text, WS_AUDIO_FORMAT, reference_id)
+    try:
+        held = await admit_upstream(user_id, key, settings.TTS_ADMISSION_EVENT_WAIT_SEC)
+    except AdmissionRejected as e:
+        return False, False, e.reason
+    return True, held, None
+
+
+async def handle_events(events: List[Event]):
+    """
+    Generate one line of copy for a user's event (or a coalesced burst of them,
+    which then carries "coalesced": [event types]) and dispatch it via WS:
+      - type='speak': client may fetch /voice/say and play audio (if voice is enabled);
+                      audio-enabled sockets get the audio pushed instead (audio.pushed);
+                      audio_url is set when the line is already cached
+      - type='chat' : text only; also used when TTS can't be admitted in time
+                      (the message then carries "degraded": <reason>)
+      - type='update': sent later, with the same message_id, when Letta missed the
+                      event's deadline (fallback text went out) but replied within grace
+    """
+    event = events[-1]
+    try:
+        prefs = user_prefs.get(event.user_id, UserPrefs())
+        personality = get_personality(prefs.personality_id)
+        account = await asyncio.to_thread(get_account, event.user_id)
+        text, late = await generate_text_for_events(events)
+        voice_reference = None
+        if account and account.get("voice_model"):
+            voice_reference = account["voice_model"]
+        else:
+            voice_reference = personality.voice_reference_id
+        msg_type = "speak" if prefs.voice_enabled else "chat"
+        push_audio = msg_type == "speak" and ws_manager.wants_audio(event.user_id)
+        held, degraded = False, None
+        if msg_type == "speak":
+            admitted, held, degraded = await admit_event_speech(
+                event.user_id, text, voice_reference, push_audio
+            )
+            if not admitted:
+                msg_type, push_audio = "chat", False
+        message = {
+            "type": msg_type,
+            "message_id": uuid.uuid4().hex,
+            "event": event.type.value,
+            "text": text,
+            "data": event.data,
+            "personality": personality.id,
+            "voice_reference_id": voice_reference,
+        }
+        if len(events) > 1:
+            message["coalesced"] = [e.type.value for e in events]
+        if degraded:
+            message["degraded"] = degraded
+        elif msg_type == "speak":
+            # Already synthesized with the default settings: clients can just play/replay this
+            url = await asyncio.to_thread(cached_audio_url, tts_key(text, WS_AUDIO_FORMAT, voice_reference))
+            if url:
+                message["audio_url"] = url
+        if push_audio:
+            # Opted-in sockets get the audio pushed; they shouldn't call /voice/say
+            message["audio"] = {"format": WS_AUDIO_FORMAT, "pushed": True}
+        try:
+            await ws_manager.send_json(event.user_id, message)
+        except BaseException:
+            if held:
+                tts_admission.release()
+            raise
+        if push_audio:
+            # Only after the message: every socket learns the message_id before its audio_start
+            start_speech_audio(event.user_id, message["message_id"], text, voice_reference, held)
+        if late is not None:
+            start_late_delivery(event, message, late)
+    except Exception as e:
+        prefs = user_prefs.get(event.user_id, UserPrefs())
+        personality = get_personality(prefs.personality_id)
+        account = await asyncio.to_thread(get_account, event.user_id)
+        voice_reference = None
+        if account and account.get("voice_model"):
+            voice_reference = account["voice_model"]
+        else:
+            voice_reference = personality.voice_reference_id
+        await ws_manager.send_json(event.user_id, {
+            "type": "chat", "event": event.type.value,
+            "text": fallback_text_for(event, personality),
+            "data": event.data,
+            "error": str(e),
+            "personality": personality.id,
+            "voice_reference_id": voice_reference,
+        })
+
+
+# ===================== Sharded orchestrator =====================
+class OrchestratorStats:
+    def __init__(self) -> None:
+        self.processed = 0
+        self.messages = 0
+        self.coalesced = 0                  # events merged into another event's message
+        self.queue_wait = LatencyWindow()   # enqueue → worker picks it up
+        self.end_to_end = LatencyWindow()   # enqueue → WebSocket send done
+
+    def snapshot(self, shards) -> dict:
+        return {
+            "workers": len(shards),
+            "shard_queue_max": settings.ORCH_SHARD_QUEUE,
+            "shard_depths": [q.qsize() for q in shards],
+            "backlog": event_queue.qsize(),
+            "coalesce_window_ms": settings.ORCH_COALESCE_MS,
+            "users_coalescing": len(_coalescing),
+            "bursts_pending": len(_due),
+            "processed": self.processed,
+            "messages": self.messages,
+            "coalesced": self.coalesced,
+            "queue_wait": self.queue_wait.snapshot(),
+            "end_to_end": self.end_to_end.snapshot(),
+        }
+
+
+orchestrator_stats = OrchestratorStats()
+_shards: "List[asyncio.Queue[List[Event]]]" = []
+_coalescing: Dict[str, List[Event]] = {}  # user_id → burst still inside its window
+_due: List[Tuple[float, int, str, List[Event]]] = []  # (window closes, seq, user_id, burst) heap
+_burst_seq = 0
+
+
+def shard_for(user_id: str, n: int) -> int:
+    # Stable across processes/restarts, unlike hash()
+    return zlib.crc32(user_id.encode("utf-8")) % n
+
+
+async def _orchestrator_worker(shard: "asyncio.Queue[List[Event]]"):
     while True:
-        event: Event = await event_queue.get()
+        events = await shard.get()
+        now = time.monotonic()
+        for event in events:
+            orchestrator_stats.queue_wait.add((now - event.created_at) * 1000.0)
         try:
-            prefs = user_prefs.get(event.user_id, UserPrefs())
-            personality = get_personality(prefs.personality_id)
-            account = get_account(event.user_id)
-            text = await generate_text_for_event(event)
-            voice_reference = None
-            if account and account.get("voice_model"):
-                voice_reference = account["voice_model"]
-            else:
-                voice_reference = personality.voice_reference_id
-            msg_type = "speak" if prefs.voice_enabled else "chat"
-            await ws_manager.send_json(event.user_id, {
-                "type": msg_type,
-                "event": event.type.value,
-                "text": text,
-                "data": event.data,
-                "personality": personality.id,
-                "voice_reference_id": voice_reference,
-            })
+            await handle_events(events)
         except Exception as e:
-            prefs = user_prefs.get(event.user_id, UserPrefs())
-            personality = get_personality(prefs.personality_id)
-            account = get_account(event.user_id)
-            voice_reference = None
-            if account and account.get("voice_model"):
-                voice_reference = account["voice_model"]
-            else:
-                voice_reference = personality.voice_reference_id
-            await ws_manager.send_json(event.user_id, {
-                "type": "chat", "event": event.type.value,
-                "text": fallback_text_for(event, personality),
-                "data": event.data,
-                "error": str(e),
-                "personality": personality.id,
-                "voice_reference_id": voice_reference,
-            })
+            print(f"[Orchestrator] unhandled error for {events[-1].user_id}: {e}")
         finally:
-            event_queue.task_done()
+            now = time.monotonic()
+            orchestrator_stats.messages += 1
+            orchestrator_stats.coalesced += len(events) - 1
+            for event in events:
+                orchestrator_stats.processed += 1
+                orchestrator_stats.end_to_end.add((now - event.created_at) * 1000.0)
+                event_queue.task_done()
+            shard.task_done()
+
+
+def _coalesce(event: Event, now: float) -> None:
+    burst = _coalescing.get(event.user_id)
+    if burst is not None:
+        burst.append(event)
+        if len(burst) >= settings.ORCH_COALESCE_MAX_EVENTS:
+            del _coalescing[event.user_id]  # full: later events start a new burst
+        return
+    burst = _coalescing[event.user_id] = [event]
+    global _burst_seq
+    _burst_seq += 1
+    heapq.heappush(_due, (now + settings.ORCH_COALESCE_MS / 1000.0, _burst_seq, event.user_id, burst))
+
+
+async def _flush_due(loop: asyncio.AbstractEventLoop) -> Optional[float]:
+    """Hand every burst whose window has closed to its shard; seconds until the next one closes."""
+    while _due:
+        delay = _due[0][0] - loop.time()
+        if delay > 0:
+            return delay
+        _, _, user_id, burst = heapq.heappop(_due)
+        if _coalescing.get(user_id) is burst:
+            del _coalescing[user_id]
+        await _shards[shard_for(user_id, len(_shards))].put(burst)
+    return None
+
+
+async def voice_orchestrator():
+    """
+    Drain event_queue into ORCH_WORKERS shard queues keyed by user_id: one
+    user's events are handled in order, different users in parallel. With
+    ORCH_COALESCE_MS > 0, a user's events arriving within that window of the
+    first one are handed over together and answered with one message; open
+    bursts wait in a deadline heap and this loop hands them over itself. A
+    full shard applies backpressure rather than dropping events.
+    """
+    _shards[:] = [asyncio.Queue(maxsize=settings.ORCH_SHARD_QUEUE) for _ in range(max(1, settings.ORCH_WORKERS))]
+    workers = [asyncio.create_task(_orchestrator_worker(q)) for q in _shards]
+    _coalescing.clear()
+    _due.clear()
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            if settings.ORCH_COALESCE_MS <= 0:
+                event: Event = await event_queue.get()
+                await _shards[shard_for(event.user_id, len(_shards))].put([event])
+                continue
+            timeout = await _flush_due(loop)
+            try:
+                event = await asyncio.wait_for(event_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                continue
+            _coalesce(event, loop.time())
+    finally:
+        for w in workers:
+            w.cancel()
+
+
+def orchestrator_snapshot() -> dict:
+    return orchestrator_stats.snapshot(_shards)
 
 
 # ===================== No-reply follow-up scanner =====================